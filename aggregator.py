@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+from dotenv import load_dotenv
+from notifiers import AlertAggregator, NotificationDispatcher, NotificationManager
+from app.remote import AggregatorServer
+from app.metrics import start_metrics_server
+
+
+class CentralAggregator:
+    """複数の監視エージェントからの状態変化をまとめて通知する
+
+    エージェント（python app/monitor.py --headless --aggregator host:port）は
+    状態変化だけを送り、重複除去・クールダウン・LINE/デスクトップ通知はここで行う。
+    """
+
+    def __init__(self):
+        self.notification_manager = NotificationManager()
+        self.dispatcher = NotificationDispatcher(
+            self.notification_manager,
+            workers=int(os.getenv('NOTIFICATION_WORKERS', 4)),
+            outbox_path=os.path.expanduser(os.getenv('NOTIFICATION_OUTBOX') or '~/.tiktok_aggregator_outbox.json')
+        )
+        methods = [m.strip() for m in os.getenv('AGGREGATOR_NOTIFICATION_METHODS', 'desktop,line').split(',') if m.strip()]
+        self.alerts = AlertAggregator(
+            self.dispatcher,
+            window=float(os.getenv('ALERT_WINDOW_SECONDS', 5)),
+            cooldown=int(os.getenv('NOTIFICATION_COOLDOWN', 300)),
+            methods=methods
+        )
+        # ループバック以外で待ち受ける場合は AGGREGATOR_TOKEN が必須（エージェントと同じ値）
+        self.server = AggregatorServer(os.getenv('AGGREGATOR_LISTEN', '127.0.0.1:9750'), self.on_event,
+                                       token=os.getenv('AGGREGATOR_TOKEN'),
+                                       read_timeout=float(os.getenv('AGGREGATOR_READ_TIMEOUT', 120)))
+        self.stale_after = float(os.getenv('AGENT_STALE_SECONDS', 120))
+        self.stale = set()
+
+    def on_event(self, event, previous):
+        """エージェントから届いた状態変化"""
+        agent, target = event['agent'], event.get('target')
+        if event.get('running'):
+            if previous is not None:
+                logging.info(f"アプリケーションが再起動されました ({agent}: {target})")
+            return
+        if previous is None:
+            # 起動時点で停止していた場合は変化として扱わない
+            return
+
+        self.alerts.add(
+            f"{agent}:{target}",
+            f"TikTok LIVE Studio アラート ({agent})",
+            f"{target} が終了しました。認証が必要な可能性があります。"
+        )
+
+    def check_agents(self):
+        """応答がなくなったエージェントを通知"""
+        stale = set(self.server.stale_agents(self.stale_after))
+        for agent in stale - self.stale:
+            logging.warning(f"エージェントから応答がありません: {agent}")
+            self.alerts.add(
+                f"{agent}:stale",
+                f"TikTok LIVE Studio アラート ({agent})",
+                f"監視エージェントから {int(self.stale_after)}秒以上応答がありません"
+            )
+        self.stale = stale
+
+    def run(self):
+        """Ctrl+C まで待ち受けを続ける"""
+        self.server.start()
+        self.dispatcher.start()
+        self.alerts.start()
+        logging.info(f"アグリゲーターを開始しました: {self.server.listen_address}")
+        try:
+            while True:
+                time.sleep(5)
+                self.check_agents()
+        except KeyboardInterrupt:
+            logging.info("アグリゲーターを終了します")
+        finally:
+            self.server.stop()
+            self.alerts.stop()
+            self.dispatcher.stop()
+            logging.info(f"受信統計: {self.server.stats()}")
+            logging.info(f"アラート統計: {self.alerts.stats()}")
+            logging.info(f"通知統計: {self.dispatcher.stats()}")
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    start_metrics_server(os.getenv('METRICS_ADDRESS'))
+    try:
+        CentralAggregator().run()
+    except ValueError as e:
+        logging.error(f"アグリゲーターを開始できません: {e}")
+
+
+if __name__ == "__main__":
+    main()
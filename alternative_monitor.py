@@ -1,152 +1,232 @@
 import os
 import time
-import psutil
 import logging
-from datetime import datetime
+import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from scapy.all import sniff, IP
-from notifiers import NotificationManager
+from notifiers import AlertAggregator, NotificationDispatcher, NotificationManager
 from dotenv import load_dotenv
+from app.process_detector import ProcessDetector
+from log_tailer import LogTailer
+from log_rules import LogRuleMatcher
+from event_debouncer import EventDebouncer
+from network_filter import PacketScanner, build_bpf, scan_pcap, sniff_raw
+from orchestrator import CpuBudget, DetectorOrchestrator
+from app.scheduler import AdaptiveInterval, TickEngine
+from app.metrics import LOG_BYTES_SCANNED, PROCESS_SCAN_SECONDS, TICK_SECONDS, start_metrics_server
 
 class TikTokStudioMonitor:
     def __init__(self):
         self.notification_manager = NotificationManager()
+        self.dispatcher = NotificationDispatcher(
+            self.notification_manager,
+            workers=int(os.getenv('NOTIFICATION_WORKERS', 4)),
+            outbox_path=os.path.expanduser(os.getenv('NOTIFICATION_OUTBOX') or '~/.tiktok_studio_monitor_outbox.json')
+        )
         self.log_dir = os.getenv('TIKTOK_LOG_DIR', '')  # TikTok Studio のログディレクトリ
+        self.log_tailer = LogTailer(os.path.expanduser(
+            os.getenv('LOG_OFFSETS_PATH', '~/.tiktok_monitor_log_offsets.json')
+        ))
+        self.log_matcher = LogRuleMatcher.from_config(os.getenv('LOG_RULES'))
+        # 設定値のまとめる時間（CPU予算による伸縮は常にこの値を基準にする）
+        self.log_debounce_window = float(os.getenv('LOG_DEBOUNCE_SECONDS', 0.5))
+        self.log_debouncer = EventDebouncer(
+            self.check_log_content,
+            window=self.log_debounce_window,
+            max_pending=int(os.getenv('LOG_QUEUE_SIZE', 256))
+        )
         self.process_name = "TikTokLiveStudio.exe"  # プロセス名
-        self.last_notification_time = None
-        self.notification_cooldown = int(os.getenv('NOTIFICATION_COOLDOWN', 300))
-
-    def should_notify(self):
-        """通知クールダウンチェック"""
-        if self.last_notification_time is None:
-            return True
-
-        time_diff = (datetime.now() - self.last_notification_time).total_seconds()
-        return time_diff > self.notification_cooldown
+        self.process_detector = ProcessDetector(self.process_name, exact=True,
+                                                on_scan=PROCESS_SCAN_SECONDS.observe)
+        # 同時に発生したアラートをまとめ、クールダウンはアラートの種類ごとに管理する
+        self.aggregator = AlertAggregator(
+            self.dispatcher,
+            window=float(os.getenv('ALERT_WINDOW_SECONDS', 5)),
+            cooldown=int(os.getenv('NOTIFICATION_COOLDOWN', 300))
+        )
+        self.cpu_budget = None
 
-    def send_notifications(self, title, message, methods=None):
-        """通知を送信"""
-        if not self.should_notify():
-            return
+    def budgeted(self, seconds):
+        """CPU予算を超えている場合は延ばした待機時間"""
+        if self.cpu_budget is not None:
+            seconds = self.cpu_budget.scale(seconds)
+        return seconds
 
-        if methods is None:
-            methods = ['desktop', 'line']
+    def pause(self, seconds, stop_event):
+        """停止要求があるまで待機（CPU予算を超えている場合は間隔を延ばす）"""
+        return stop_event.wait(self.budgeted(seconds))
 
-        for method in methods:
-            self.notification_manager.send_notification(method, title, message)
+    def send_notifications(self, title, message, methods=None, key=None):
+        """通知を送信（key が同じアラートはまとめられ、クールダウンも共有する）"""
+        self.aggregator.add(key or title, title, message, methods)
 
-        self.last_notification_time = datetime.now()
+    def check_log_content(self, log_path):
+        """ログファイルの追記分を確認（ワーカースレッドで実行）"""
+        try:
+            # 前回から追記された行だけを確認
+            data = self.log_tailer.read_new(log_path)
+            LOG_BYTES_SCANNED.inc(len(data))
+            rule = self.log_matcher.search(data)
+            if rule is not None:
+                self.send_notifications(
+                    "TikTok LIVE Studio認証アラート",
+                    f"ログファイルで認証イベントを検出しました (ルール: {rule})",
+                    key=f"log:{rule}"
+                )
+        except Exception as e:
+            logging.error(f"ログファイル読み取りエラー: {e}")
 
     def monitor_log_files(self):
         """ログファイルの監視"""
         class LogHandler(FileSystemEventHandler):
-            def __init__(self, callback):
-                self.callback = callback
+            def __init__(self, debouncer):
+                self.debouncer = debouncer
 
             def on_modified(self, event):
                 if event.is_directory:
                     return
                 if event.src_path.endswith('.log'):
-                    self.check_log_content(event.src_path)
-
-            def check_log_content(self, log_path):
-                try:
-                    with open(log_path, 'r', encoding='utf-8') as f:
-                        last_lines = f.readlines()[-50:]  # 最後の50行を確認
-                        for line in last_lines:
-                            if "authentication" in line.lower() or "login" in line.lower():
-                                self.callback("ログファイルで認証イベントを検出しました")
-                except Exception as e:
-                    logging.error(f"ログファイル読み取りエラー: {e}")
+                    # 読み込みはワーカー側でまとめて行う
+                    self.debouncer.submit(event.src_path)
 
         if not self.log_dir:
             logging.warning("ログディレクトリが設定されていません")
             return
 
-        event_handler = LogHandler(
-            lambda msg: self.send_notifications(
-                "TikTok LIVE Studio認証アラート",
-                msg
-            )
-        )
+        # 既存のログは末尾から読み始める
+        for filename in os.listdir(self.log_dir):
+            if filename.endswith('.log'):
+                self.log_tailer.prime(os.path.join(self.log_dir, filename))
+
+        self.log_debouncer.start()
         observer = Observer()
-        observer.schedule(event_handler, self.log_dir, recursive=False)
+        observer.schedule(LogHandler(self.log_debouncer), self.log_dir, recursive=False)
         observer.start()
         return observer
 
-    def monitor_process(self):
+    def run_log_monitor(self, stop_event):
+        """ログファイル監視を停止要求まで実行"""
+        observer = self.monitor_log_files()
+        if observer is None:
+            return
+
+        # 再起動された場合も、前回伸ばした値ではなく設定値から始める
+        self.log_debouncer.window = self.log_debounce_window
+        try:
+            while not stop_event.wait(1):
+                # CPU予算を超えている間は変更イベントをより長くまとめる
+                if self.cpu_budget is not None:
+                    self.log_debouncer.window = self.cpu_budget.scale(self.log_debounce_window)
+        finally:
+            observer.stop()
+            observer.join()
+            self.log_debouncer.stop()
+            self.log_tailer.save()
+            logging.info(f"ログイベント統計: {self.log_debouncer.stats()}")
+
+    def monitor_process(self, stop_event=None):
         """プロセスの状態を監視"""
+        if stop_event is None:
+            stop_event = threading.Event()
         last_status = None
+        scheduler = AdaptiveInterval(
+            base=int(os.getenv('CHECK_INTERVAL', 30)),
+            fast=float(os.getenv('FAST_CHECK_INTERVAL', 2)),
+            max_interval=float(os.getenv('MAX_CHECK_INTERVAL', 120)),
+            cpu_budget=float(os.getenv('CPU_BUDGET_PERCENT', 10))
+        )
+        ticker = TickEngine(stop_event)
+        tick_seconds = TICK_SECONDS.labels('process')
 
-        while True:
+        ticker.reset()
+        while not stop_event.is_set():
             try:
-                current_status = False
-                for proc in psutil.process_iter(['name']):
-                    if proc.info['name'] == self.process_name:
-                        current_status = True
-                        break
+                started = time.monotonic()
+                current_status = self.process_detector.is_running()
+                work_time = time.monotonic() - started
+                tick_seconds.observe(work_time)
+                interval = scheduler.update(current_status, work_time)
 
                 if last_status is not None and last_status != current_status:
                     if not current_status:
                         self.send_notifications(
                             "TikTok LIVE Studio状態変更",
-                            "プロセスが終了しました - 認証が必要な可能性があります"
+                            "プロセスが終了しました - 認証が必要な可能性があります",
+                            key="process:exit"
                         )
 
                 last_status = current_status
-                time.sleep(30)  # 30秒ごとにチェック
+                ticker.wait(self.budgeted(interval))
 
             except Exception as e:
                 logging.error(f"プロセス監視エラー: {e}")
-                time.sleep(30)
+                ticker.wait(self.budgeted(scheduler.base))
 
-    def monitor_network(self):
+        logging.info(f"プロセス監視のティック統計: {ticker.stats()}")
+
+    def monitor_network(self, stop_event=None):
         """ネットワークトラフィックを監視"""
-        def packet_callback(packet):
-            if IP in packet:
-                if packet[IP].dst.startswith('203.'):  # TikTokのIPアドレス範囲（例）
-                    if "authentication" in str(packet).lower():
-                        self.send_notifications(
-                            "TikTok LIVE Studio認証アラート",
-                            "認証関連のネットワークトラフィックを検出しました"
-                        )
+        # TikTokのIPアドレス範囲とポート（例）。NETWORK_BPF で式を直接指定することもできる
+        bpf = os.getenv('NETWORK_BPF') or build_bpf(
+            os.getenv('NETWORK_CIDRS', '203.0.0.0/8').split(','),
+            os.getenv('NETWORK_PORTS', '80,443').split(',')
+        )
+        scanner = PacketScanner(LogRuleMatcher.from_config(
+            os.getenv('NETWORK_RULES', 'authentication=authentication')
+        ))
 
-        try:
-            sniff(
-                filter="host 203.0.0.0/8",  # TikTokのIPアドレス範囲（例）
-                prn=packet_callback,
-                store=0
+        def on_match(rule, raw):
+            self.send_notifications(
+                "TikTok LIVE Studio認証アラート",
+                f"認証関連のネットワークトラフィックを検出しました (ルール: {rule})",
+                key=f"network:{rule}"
             )
+
+        pcap_path = os.getenv('NETWORK_PCAP', '')
+        try:
+            if pcap_path:
+                # 保存済みのキャプチャをまとめて解析
+                stats = scan_pcap(pcap_path, scanner, on_match)
+            else:
+                logging.info(f"キャプチャフィルタ: {bpf}")
+                stats = sniff_raw(bpf, scanner, on_match, stop_event=stop_event, throttle=self.budgeted)
+            logging.info(f"ネットワーク監視統計: {stats}")
         except Exception as e:
             logging.error(f"ネットワーク監視エラー: {e}")
+            raise
 
 def main():
     load_dotenv()
     logging.basicConfig(level=logging.INFO)
+    start_metrics_server(os.getenv('METRICS_ADDRESS'))
 
     monitor = TikTokStudioMonitor()
 
     # 監視方法の選択
     monitoring_methods = os.getenv('MONITORING_METHODS', 'process,log').split(',')
-
-    if 'process' in monitoring_methods:
-        logging.info("プロセス監視を開始します...")
-        monitor.monitor_process()
-
-    if 'log' in monitoring_methods:
-        logging.info("ログファイル監視を開始します...")
-        observer = monitor.monitor_log_files()
-        try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            observer.stop()
-        observer.join()
-
-    if 'network' in monitoring_methods:
-        logging.info("ネットワークトラフィック監視を開始します...")
-        monitor.monitor_network()
+    detectors = {
+        'process': monitor.monitor_process,
+        'log': monitor.run_log_monitor,
+        'network': monitor.monitor_network,
+    }
+
+    # 有効な監視方法をすべて同時に実行する
+    monitor.cpu_budget = CpuBudget(float(os.getenv('CPU_BUDGET_PERCENT', 10)))
+    orchestrator = DetectorOrchestrator(cpu_budget=monitor.cpu_budget)
+    for method in monitoring_methods:
+        method = method.strip()
+        if method in detectors:
+            orchestrator.add(method, detectors[method])
+        elif method:
+            logging.warning(f"未対応の監視方法です: {method}")
+
+    monitor.dispatcher.start()
+    monitor.aggregator.start()
+    orchestrator.run()
+    monitor.aggregator.stop()
+    monitor.dispatcher.stop()
+    logging.info(f"アラート統計: {monitor.aggregator.stats()}")
+    logging.info(f"通知統計: {monitor.dispatcher.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
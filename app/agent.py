@@ -0,0 +1,18 @@
+"""
+ヘッドレスのエージェント用の起動スクリプト
+
+build.py --headless でビルドするエージェント用EXEのエントリーポイント。
+引数なしで起動しても（ダブルクリックやサービスとして登録した場合も）
+常にトレイアイコンと設定ダイアログを使わずに監視する。
+"""
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from monitor import main
+
+if __name__ == "__main__":
+    main(headless=True)
@@ -0,0 +1,328 @@
+import bisect
+import logging
+import weakref
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 処理時間ヒストグラムの既定のバケット（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _ShardOwner:
+    """スレッドの終了を検知するための目印（スレッドローカルに置く）"""
+    __slots__ = ('__weakref__',)
+
+
+class _Sharded:
+    """スレッドごとの値（シャード）を持ち、読み出し時に合計する
+
+    各スレッドは自分のシャードにだけ書き込むため、更新にロックが不要で、
+    競合による値の取りこぼしも起きない。終了したスレッドのシャードは
+    基準値（_base）に合算して取り除くため、接続ごとのスレッドや再起動した
+    検出処理のスレッドが増えてもシャードの数は生きているスレッド数で済む。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._base = self._new_shard()
+        self._shards = {}  # id -> 生きているスレッドのシャード
+
+    def _new_shard(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def _merge(into, shard):
+        raise NotImplementedError
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = self._new_shard()
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(owner)] = shard
+            # スレッドが終了してスレッドローカルが破棄されたら合算する
+            finalizer = weakref.finalize(owner, self._retire, id(owner))
+            finalizer.atexit = False
+            return shard
+
+    def _retire(self, key):
+        with self._lock:
+            shard = self._shards.pop(key, None)
+            if shard is not None:
+                self._merge(self._base, shard)
+
+    def _collect(self, into):
+        """すべてのシャードを into に合算する（合算中のシャードを二重に数えないようロックする）"""
+        with self._lock:
+            self._merge(into, self._base)
+            for shard in self._shards.values():
+                self._merge(into, shard)
+        return into
+
+
+class _CounterChild(_Sharded):
+    def _new_shard(self):
+        return [0]
+
+    @staticmethod
+    def _merge(into, shard):
+        into[0] += shard[0]
+
+    def inc(self, amount=1):
+        self._shard()[0] += amount
+
+    @property
+    def value(self):
+        return self._collect([0])[0]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """読み出しのたびに function() の値を使う（キューの長さなど）"""
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return float('nan')
+        return self._value
+
+
+class _HistogramChild(_Sharded):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        super().__init__()
+
+    def _new_shard(self):
+        # バケットごとの件数（最後は +Inf）と合計値
+        return [[0] * (len(self.buckets) + 1), 0.0]
+
+    @staticmethod
+    def _merge(into, shard):
+        for i, count in enumerate(shard[0]):
+            into[0][i] += count
+        into[1] += shard[1]
+
+    def observe(self, value):
+        shard = self._shard()
+        shard[0][bisect.bisect_left(self.buckets, value)] += 1
+        shard[1] += value
+
+    def snapshot(self):
+        """(バケットごとの件数, 合計値)"""
+        counts, total = self._collect(self._new_shard())
+        return counts, total
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """ラベルの値ごとの系列（ホットパスでは戻り値を保持して使う）"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _format_labels(self.labelnames, values), child.value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """増加のみのカウンター"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """現在値（状態・キューの長さなど）"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+
+class Histogram(_Metric):
+    """値の分布（処理時間など）"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ('le', _format_value(float(bound))))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """メトリクスの一覧と Prometheus のテキスト形式への変換"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+TICK_SECONDS = Histogram(
+    'tiktok_monitor_tick_duration_seconds', "1回のチェックにかかった時間", ['monitor'])
+PROCESS_SCAN_SECONDS = Histogram(
+    'tiktok_monitor_process_scan_seconds', "プロセス一覧の走査にかかった時間")
+CAPTURE_SECONDS = Histogram(
+    'tiktok_monitor_capture_seconds', "画面キャプチャにかかった時間")
+MATCH_SECONDS = Histogram(
+    'tiktok_monitor_match_seconds', "認証画面の照合にかかった時間")
+LOG_BYTES_SCANNED = Counter(
+    'tiktok_monitor_log_bytes_scanned_total', "照合したログのバイト数")
+NOTIFICATION_QUEUE_DEPTH = Gauge(
+    'tiktok_monitor_notification_queue_depth', "送信待ちの通知の数")
+NOTIFICATION_SECONDS = Histogram(
+    'tiktok_monitor_notification_delivery_seconds', "通知の受付から送信完了までの時間", ['method'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+NOTIFICATIONS = Counter(
+    'tiktok_monitor_notifications_total', "通知の送信結果", ['method', 'result'])
+DETECTOR_UP = Gauge(
+    'tiktok_monitor_detector_up', "検出処理が動作中か（1: 動作中、0: 停止・異常終了）", ['detector'])
+TARGET_RUNNING = Gauge(
+    'tiktok_monitor_target_running', "監視対象のプロセスが実行中か", ['target'])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        payload = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """GET /metrics でメトリクスを返す HTTP サーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=None):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry or REGISTRY
+        self._thread = None
+
+    def start(self):
+        """バックグラウンドスレッドで起動"""
+        self._thread = threading.Thread(target=self.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def start_metrics_server(address):
+    """address（"host:port" または "port"）で待ち受けを開始（空なら何もしない）"""
+    if not address:
+        return None
+    host, _, port = str(address).rpartition(':')
+    try:
+        server = MetricsServer(host or '127.0.0.1', int(port)).start()
+    except OSError as e:
+        logging.error(f"メトリクスの待ち受けを開始できませんでした ({address}): {e}")
+        return None
+    logging.info(f"メトリクスを公開しています: http://{host or '127.0.0.1'}:{port}/metrics")
+    return server
@@ -1,12 +1,9 @@
 import os
 import sys
 import time
-import psutil
 import logging
-from datetime import datetime
-from plyer import notification
-import pystray
-from PIL import Image
+import argparse
+import importlib.util
 import threading
 import json
 
@@ -15,20 +12,51 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from setup_gui import SetupDialog
+from process_detector import ProcessDetector
+from process_watcher import ProcessExitWatcher
+from scheduler import AdaptiveInterval, TickEngine
+from remote import AgentClient
+from metrics import PROCESS_SCAN_SECONDS, TARGET_RUNNING, TICK_SECONDS, start_metrics_server
 
 class SimpleMonitor:
-    def __init__(self, config=None):
+    def __init__(self, config=None, headless=False):
         self.config = config or {}
+        self.headless = headless
         self.process_name = self.config.get('process_name', 'TikTokLiveStudio')
         self.check_interval = self.config.get('check_interval', 30)
         self.notification_cooldown = self.config.get('notification_cooldown', 300)
         self.last_notification_time = None
+        self.watch_exit = self.config.get('watch_exit', True)
+        self.detector = ProcessDetector(self.process_name, on_scan=PROCESS_SCAN_SECONDS.observe)
+        self.watcher = ProcessExitWatcher()
+        self.scheduler = self.create_scheduler()
+        self.ticker = TickEngine()
         self.running = True
-        self.setup_tray()
+        # アグリゲーターが設定されていれば、通知はアグリゲーター側でまとめて行う
+        self.agent = None
+        if self.config.get('aggregator_address'):
+            self.agent = AgentClient(self.config['aggregator_address'],
+                                     agent_id=self.config.get('agent_id'),
+                                     token=self.config.get('aggregator_token') or os.getenv('AGGREGATOR_TOKEN'))
+        self.icon = None
+        if not headless:
+            self.setup_tray()
+
+    def create_scheduler(self):
+        """設定からチェック間隔のスケジューラを作成"""
+        return AdaptiveInterval(
+            base=self.check_interval,
+            fast=self.config.get('fast_check_interval', 2),
+            max_interval=self.config.get('max_check_interval', 120),
+            cpu_budget=self.config.get('cpu_budget_percent', 10)
+        )
 
     def setup_tray(self):
         """システムトレイアイコンのセットアップ"""
+        # GUI のバックエンドは使用時に読み込む（ヘッドレスのエージェントでは読み込まない）
+        import pystray
+        from PIL import Image
+
         # デフォルトの画像を作成（黒い16x16のイメージ）
         image = Image.new('RGB', (16, 16), 'black')
         menu = pystray.Menu(
@@ -44,6 +72,8 @@ class SimpleMonitor:
 
     def show_settings(self):
         """設定ダイアログを表示"""
+        from setup_gui import SetupDialog
+
         def show_dialog():
             dialog = SetupDialog()
             new_config = dialog.run()
@@ -58,8 +88,12 @@ class SimpleMonitor:
         """設定を更新"""
         self.config = new_config
         self.process_name = new_config.get('process_name', self.process_name)
+        self.detector.process_name = self.process_name
+        self.watch_exit = new_config.get('watch_exit', self.watch_exit)
+        self.watcher.cancel()
         self.check_interval = new_config.get('check_interval', self.check_interval)
         self.notification_cooldown = new_config.get('notification_cooldown', self.notification_cooldown)
+        self.scheduler = self.create_scheduler()
         logging.info("設定を更新しました")
 
     def should_notify(self):
@@ -67,7 +101,8 @@ class SimpleMonitor:
         if self.last_notification_time is None:
             return True
 
-        time_diff = (datetime.now() - self.last_notification_time).total_seconds()
+        # 壁時計の変更に影響されないよう monotonic 時計で比較する
+        time_diff = time.monotonic() - self.last_notification_time
         return time_diff > self.notification_cooldown
 
     def send_notification(self, title, message):
@@ -76,43 +111,66 @@ class SimpleMonitor:
             return
 
         try:
+            from plyer import notification
             notification.notify(
                 title=title,
                 message=message,
                 app_icon=None,
                 timeout=10
             )
-            self.last_notification_time = datetime.now()
+            self.last_notification_time = time.monotonic()
             logging.info(f"通知を送信しました: {title}")
         except Exception as e:
             logging.error(f"通知送信エラー: {e}")
 
     def is_process_running(self):
         """プロセスが実行中かチェック"""
-        for proc in psutil.process_iter(['name']):
-            try:
-                if self.process_name.lower() in proc.info['name'].lower():
-                    return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return False
+        return self.detector.is_running()
+
+    def wait_for_exit(self):
+        """プロセスの終了をイベントで待機"""
+        self.watcher.watch(self.detector.pid, self.detector.create_time)
+        while self.running and not self.watcher.wait(1):
+            if not self.watcher.is_watching():
+                # 設定変更などで待機が中止された
+                break
 
     def stop_monitoring(self):
         """モニタリングを停止"""
         self.running = False
-        self.icon.stop()
+        self.watcher.cancel()
+        self.ticker.wake()
+        logging.info(f"検出統計: {self.detector.stats()}, ティック: {self.ticker.stats()}")
+        if self.agent is not None:
+            self.agent.stop()
+            logging.info(f"エージェント送信統計: {self.agent.stats()}")
+        if self.icon is not None:
+            self.icon.stop()
 
     def start_monitoring(self):
         """モニタリングを開始"""
         logging.info(f"モニタリングを開始します... (プロセス名: {self.process_name})")
         last_status = None
+        if self.agent is not None:
+            self.agent.start()
+        tick_seconds = TICK_SECONDS.labels('app')
+        self.ticker.reset()
 
         while self.running:
             try:
+                started = time.monotonic()
                 current_status = self.is_process_running()
+                work_time = time.monotonic() - started
+                tick_seconds.observe(work_time)
+                TARGET_RUNNING.labels(self.process_name).set(int(current_status))
+                interval = self.scheduler.update(current_status, work_time)
+
+                # 状態の変化（起動直後の状態を含む）をアグリゲーターへ送る
+                if self.agent is not None and last_status != current_status:
+                    self.agent.send(self.process_name, current_status)
 
                 # ステータス変更を検知
-                if last_status is not None and last_status != current_status:
+                if self.agent is None and last_status is not None and last_status != current_status:
                     if not current_status:
                         self.send_notification(
                             "TikTok LIVE Studio アラート",
@@ -122,11 +180,17 @@ class SimpleMonitor:
                         logging.info("アプリケーションが再起動されました")
 
                 last_status = current_status
-                time.sleep(self.check_interval)
+
+                # PIDが分かっていれば終了イベントを待ち、なければポーリング
+                if current_status and self.watch_exit:
+                    self.wait_for_exit()
+                    self.ticker.reset()
+                else:
+                    self.ticker.wait(interval)
 
             except Exception as e:
                 logging.error(f"モニタリングエラー: {e}")
-                time.sleep(self.check_interval)
+                self.ticker.wait(self.check_interval)
 
 def load_config():
     """設定ファイルを読み込む"""
@@ -139,7 +203,16 @@ def load_config():
         logging.error(f"設定ファイルの読み込みに失敗しました: {e}")
     return None
 
-def main():
+def main(headless=False):
+    parser = argparse.ArgumentParser(description="TikTok Studio Monitor")
+    parser.add_argument('--headless', action='store_true',
+                        help="トレイアイコンと設定ダイアログを使わずに実行")
+    parser.add_argument('--aggregator', help="状態変化を送るアグリゲーター（host:port または unix:/path）")
+    parser.add_argument('--agent-id', help="アグリゲーターに送るエージェント名（既定はホスト名）")
+    parser.add_argument('--metrics', help="メトリクスを公開するアドレス（例: 127.0.0.1:9108）")
+    args = parser.parse_args()
+    args.headless = args.headless or headless
+
     # ログ設定
     log_path = os.path.join(os.path.expanduser('~'), 'tiktok_monitor.log')
     logging.basicConfig(
@@ -151,19 +224,46 @@ def main():
         ]
     )
 
+    if not args.headless and (importlib.util.find_spec('setup_gui') is None or
+                              importlib.util.find_spec('pystray') is None):
+        # GUI のモジュールを含めずにビルドした場合など
+        logging.warning("GUI のモジュールが見つからないため、ヘッドレスで起動します")
+        args.headless = True
+
     # 設定を読み込む
     config = load_config()
 
-    # 初回起動時または設定がない場合は設定ダイアログを表示
-    if config is None:
+    if args.headless:
+        # ヘッドレスでは設定ダイアログを出さず、設定ファイルがなければ既定値で動かす
+        config = config or {}
+    elif config is None:
+        # 初回起動時または設定がない場合は設定ダイアログを表示
+        from setup_gui import SetupDialog
         dialog = SetupDialog()
         config = dialog.run()
         if config is None:
             logging.error("設定が完了していません。アプリケーションを終了します。")
             return
 
+    if args.aggregator:
+        config['aggregator_address'] = args.aggregator
+    if args.agent_id:
+        config['agent_id'] = args.agent_id
+    if args.metrics:
+        config['metrics_address'] = args.metrics
+
+    # メトリクスの公開（設定されている場合のみ）
+    start_metrics_server(config.get('metrics_address'))
+
     # モニタリング開始
-    monitor = SimpleMonitor(config)
+    monitor = SimpleMonitor(config, headless=args.headless)
+
+    if args.headless:
+        try:
+            monitor.start_monitoring()
+        except KeyboardInterrupt:
+            monitor.stop_monitoring()
+        return
 
     # モニタリングを別スレッドで開始
     monitoring_thread = threading.Thread(target=monitor.start_monitoring, daemon=True)
@@ -173,4 +273,4 @@ def main():
     monitor.icon.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
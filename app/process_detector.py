@@ -0,0 +1,190 @@
+import time
+import psutil
+
+
+class ProcessDetector:
+    """監視対象プロセスの検出（PIDキャッシュ付き）
+
+    初回は全プロセスを走査して対象を探し、見つかったプロセスの PID と
+    create_time を記録する。以降はそのPIDの生存確認だけを行い、
+    プロセスが消えた場合やPIDが再利用された場合にのみ再走査する。
+    """
+
+    def __init__(self, process_name, exact=False, cmdline=None, on_scan=None):
+        self._process_name = process_name
+        self.exact = exact
+        self.cmdline = cmdline
+        # 走査にかかった秒数を受け取るコールバック（メトリクス用）
+        self.on_scan = on_scan
+        self.pid = None
+        self.create_time = None
+        self.scan_count = 0
+        self.hit_count = 0
+
+    @property
+    def process_name(self):
+        return self._process_name
+
+    @process_name.setter
+    def process_name(self, value):
+        if value != self._process_name:
+            self._process_name = value
+            self.reset()
+
+    def reset(self):
+        """キャッシュしたPIDを破棄"""
+        self.pid = None
+        self.create_time = None
+
+    def matches(self, name):
+        """プロセス名が監視対象と一致するか"""
+        if not name:
+            return False
+        if self.exact:
+            return name == self._process_name
+        return self._process_name.lower() in name.lower()
+
+    def matches_cmdline(self, cmdline):
+        """コマンドラインが指定の文字列を含むか（指定がなければ常に一致）"""
+        if not self.cmdline:
+            return True
+        return self.cmdline in ' '.join(cmdline or ())
+
+    def _check_cached(self):
+        """キャッシュしたPIDがまだ同じプロセスを指しているか確認"""
+        try:
+            proc = psutil.Process(self.pid)
+            if proc.create_time() != self.create_time:
+                return False
+            return proc.status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+
+    def _scan(self):
+        """全プロセスを走査して対象を探す"""
+        started = time.perf_counter()
+        try:
+            return self._find()
+        finally:
+            if self.on_scan is not None:
+                self.on_scan(time.perf_counter() - started)
+
+    def _find(self):
+        self.scan_count += 1
+        attrs = ['name', 'create_time'] + (['cmdline'] if self.cmdline else [])
+        for proc in psutil.process_iter(attrs):
+            try:
+                if self.matches(proc.info['name']) and self.matches_cmdline(proc.info.get('cmdline')):
+                    self.pid = proc.pid
+                    self.create_time = proc.info['create_time']
+                    return True
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        self.reset()
+        return False
+
+    def is_running(self):
+        """プロセスが実行中かチェック"""
+        if self.pid is not None:
+            if self._check_cached():
+                self.hit_count += 1
+                return True
+            self.reset()
+        return self._scan()
+
+    def stats(self):
+        """走査回数とキャッシュヒット回数"""
+        return {
+            'pid': self.pid,
+            'scans': self.scan_count,
+            'hits': self.hit_count,
+        }
+
+
+class MultiProcessDetector:
+    """複数の監視対象をまとめて検出する
+
+    キャッシュしたPIDが有効な対象はその確認だけを行い、見つかっていない対象は
+    1回のプロセス一覧の走査でまとめて探す。プロセス名ごとの照合結果を
+    記録しておくため、走査のコストは対象の数ではなくプロセス数に比例する。
+    同じプロセス名の対象が複数ある場合は、別々のプロセスを順に割り当てる。
+    """
+
+    MAX_NAME_CACHE = 4096
+
+    def __init__(self, detectors, on_scan=None):
+        # {対象名: ProcessDetector}（同じ名前の対象は1つに潰れてしまうため受け付けない）
+        self.detectors = {}
+        for name, detector in detectors:
+            if name in self.detectors:
+                raise ValueError(f"監視対象の名前が重複しています: {name}")
+            self.detectors[name] = detector
+        self.on_scan = on_scan
+        self._order = list(self.detectors.values())
+        self._name_cache = {}
+        self.scan_count = 0
+        self.hit_count = 0
+
+    def _candidates(self, name):
+        """プロセス名に一致する検出器（照合結果はプロセス名ごとに記録）"""
+        candidates = self._name_cache.get(name)
+        if candidates is None:
+            if len(self._name_cache) >= self.MAX_NAME_CACHE:
+                self._name_cache.clear()
+            candidates = tuple(d for d in self._order if d.matches(name))
+            self._name_cache[name] = candidates
+        return candidates
+
+    def _scan(self, pending):
+        """見つかっていない対象を1回の走査でまとめて探す"""
+        self.scan_count += 1
+        claimed = {d.pid for d in self._order if d.pid is not None}
+        remaining = len(pending)
+        attrs = ['name', 'create_time']
+        if any(d.cmdline for d in pending):
+            attrs.append('cmdline')
+
+        for proc in psutil.process_iter(attrs):
+            try:
+                candidates = self._candidates(proc.info['name'])
+                if not candidates or proc.pid in claimed:
+                    continue
+                for detector in candidates:
+                    if detector.pid is None and detector.matches_cmdline(proc.info.get('cmdline')):
+                        detector.pid = proc.pid
+                        detector.create_time = proc.info['create_time']
+                        claimed.add(proc.pid)
+                        remaining -= 1
+                        break
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            if remaining == 0:
+                break
+
+    def poll(self):
+        """すべての対象の状態 {対象名: 実行中か}"""
+        pending = set()
+        for detector in self._order:
+            if detector.pid is not None:
+                if detector._check_cached():
+                    detector.hit_count += 1
+                    self.hit_count += 1
+                    continue
+                detector.reset()
+            pending.add(detector)
+
+        if pending:
+            started = time.perf_counter()
+            self._scan(pending)
+            if self.on_scan is not None:
+                self.on_scan(time.perf_counter() - started)
+
+        return {name: detector.pid is not None for name, detector in self.detectors.items()}
+
+    def stats(self):
+        """走査回数とキャッシュヒット回数、対象ごとのPID"""
+        return {
+            'scans': self.scan_count,
+            'hits': self.hit_count,
+            'pids': {name: detector.pid for name, detector in self.detectors.items()},
+        }
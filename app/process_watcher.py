@@ -0,0 +1,167 @@
+import os
+import select
+import logging
+import threading
+import psutil
+
+
+class _CancelPipe:
+    """終了待ちを中止するためのパイプ
+
+    閉じるのはワーカーだけで、閉じた後は wake が何も書き込まない。
+    閉じた番号は次の os.pipe などで再利用されるため、ロックの下で
+    閉じたかを確認してから書き込む。
+    """
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def wake(self):
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                os.write(self.write_fd, b'x')
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for fd in (self.read_fd, self.write_fd):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+
+class ProcessExitWatcher:
+    """プロセスの終了をイベントとして通知する
+
+    Linux では pidfd を poll し、それ以外の環境では psutil の wait で
+    ワーカースレッドをブロックさせる。終了を検知すると exited をセットし、
+    on_exit が指定されていれば PID を渡して呼び出す。
+    """
+
+    def __init__(self, on_exit=None):
+        self.on_exit = on_exit
+        self.exited = threading.Event()
+        self.pid = None
+        self._thread = None
+        self._cancel_event = threading.Event()
+        self._cancel_pipe = None
+
+    def is_watching(self, pid=None):
+        """終了待ちのスレッドが動作中か"""
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        return pid is None or pid == self.pid
+
+    def watch(self, pid, create_time=None):
+        """指定したPIDの終了待ちを開始"""
+        if self.is_watching(pid):
+            return
+        self.cancel()
+
+        self.pid = pid
+        self.exited.clear()
+        self._cancel_event = threading.Event()
+        self._cancel_pipe = _CancelPipe() if hasattr(os, 'pidfd_open') else None
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(pid, create_time, self._cancel_event, self._cancel_pipe),
+            daemon=True
+        )
+        self._thread.start()
+
+    def cancel(self):
+        """終了待ちを中止（on_exit は呼ばれない）"""
+        self._cancel_event.set()
+        if self._cancel_pipe is not None:
+            # パイプはワーカーが閉じる（ワーカーが既に閉じていれば何も書き込まない）
+            self._cancel_pipe.wake()
+        self._thread = None
+        self._cancel_pipe = None
+
+    def wait(self, timeout=None):
+        """プロセスの終了を待つ（終了していれば True）"""
+        return self.exited.wait(timeout)
+
+    def _run(self, pid, create_time, cancel_event, cancel_pipe):
+        try:
+            if cancel_pipe is not None:
+                finished = self._wait_pidfd(pid, create_time, cancel_pipe, cancel_event)
+            else:
+                finished = self._wait_psutil(pid, create_time, cancel_event)
+        except Exception as e:
+            logging.error(f"プロセス終了待機エラー: {e}")
+            finished = True
+        finally:
+            if cancel_pipe is not None:
+                cancel_pipe.close()
+
+        if not finished or cancel_event.is_set():
+            return
+
+        self.exited.set()
+        if self.on_exit is not None:
+            try:
+                self.on_exit(pid)
+            except Exception as e:
+                logging.error(f"終了イベント処理エラー: {e}")
+
+    @staticmethod
+    def _same_process(pid, create_time):
+        """PIDが再利用されていないか確認"""
+        try:
+            proc = psutil.Process(pid)
+            if create_time is not None and proc.create_time() != create_time:
+                return None
+            return proc
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    def _wait_pidfd(self, pid, create_time, cancel_pipe, cancel_event):
+        """pidfd を使って終了を待つ（Linux）"""
+        try:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            # 古いカーネルなど pidfd が使えない場合
+            return self._wait_psutil(pid, create_time, cancel_event)
+
+        try:
+            # pidfd を開いた後なら PID は再利用されない
+            if self._same_process(pid, create_time) is None:
+                return True
+
+            poller = select.poll()
+            poller.register(pidfd, select.POLLIN)
+            poller.register(cancel_pipe.read_fd, select.POLLIN)
+            for fd, _ in poller.poll():
+                if fd == pidfd:
+                    return True
+            return False
+        finally:
+            os.close(pidfd)
+
+    def _wait_psutil(self, pid, create_time, cancel_event):
+        """psutil の wait を使って終了を待つ"""
+        proc = self._same_process(pid, create_time)
+        if proc is None:
+            return True
+
+        while not cancel_event.is_set():
+            try:
+                proc.wait(timeout=1)
+                return True
+            except psutil.TimeoutExpired:
+                continue
+            except psutil.NoSuchProcess:
+                return True
+        return False
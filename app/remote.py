@@ -0,0 +1,478 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+import collections
+import socketserver
+
+DEFAULT_AGGREGATOR_PORT = 9750
+# 1行（1イベント）の最大バイト数。これを超える行は読み捨てる
+MAX_LINE_BYTES = 64 * 1024
+
+
+def parse_address(address):
+    """接続先を (family, address) に変換（"unix:/path" または "host:port"）"""
+    if isinstance(address, tuple):
+        return socket.AF_INET, address
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    if not host:
+        host, port = port, DEFAULT_AGGREGATOR_PORT
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def is_loopback(family, address):
+    """ローカルからしか接続できないアドレスか（Unix ソケットまたはループバック）"""
+    if family == socket.AF_UNIX:
+        return True
+    host = address[0]
+    return host == 'localhost' or host.startswith('127.') or host == '::1'
+
+
+def encode_events(events):
+    """イベントを改行区切りの JSON（1行1イベント）にまとめる"""
+    return ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events).encode('utf-8')
+
+
+class AgentClient:
+    """状態変化イベントをアグリゲーターへ送るエージェント
+
+    イベントはキューに溜め、batch_size 件たまるか flush_interval 秒経過するごとに
+    まとめて1回の書き込みで送る。接続できない間はキューに残して再接続を続け
+    （上限を超えた古いイベントは破棄）、送信に失敗したバッチは再送する。
+    再送による重複は、セッションID（sid）と連番（seq）でアグリゲーター側が取り除く。
+    接続するたびに最初の1行として共有トークンを含む hello を送り、アグリゲーターの
+    応答（welcome / reject）を待つ。バッチの最後には sync を付けて送り、同じ seq の
+    ack が届いた時点で送信済みとする（届かなければ接続し直して再送する）。
+    """
+
+    def __init__(self, address, agent_id=None, batch_size=64, flush_interval=0.2,
+                 max_queue=10000, heartbeat_interval=30, max_reconnect_delay=30, token=None):
+        self.family, self.address = parse_address(address)
+        self.agent_id = agent_id or socket.gethostname()
+        self.token = token
+        self.session_id = uuid.uuid4().hex[:8]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self._queue = collections.deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._stop_deadline = None
+        self._thread = None
+        self._sock = None
+        self._reader = None
+        self._seq = 0
+        self._last_sent = time.monotonic()
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.rejected = 0
+
+    def start(self):
+        """送信スレッドを開始"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="agent-client", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """キューに残ったイベントを送ってから停止（送れない場合は timeout 秒まで再試行）"""
+        self._stop_deadline = time.monotonic() + timeout
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close()
+
+    def _event(self, kind, **fields):
+        self._seq += 1
+        event = {'kind': kind, 'agent': self.agent_id, 'sid': self.session_id,
+                 'seq': self._seq, 'ts': round(time.time(), 3)}
+        event.update(fields)
+        return event
+
+    def send(self, target, running, **fields):
+        """監視対象の状態変化をキューに追加"""
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(self._event('state', target=target, running=running, **fields))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(10)
+            try:
+                sock.connect(self.address)
+            except OSError:
+                sock.close()
+                raise
+            if self.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            hello = {'kind': 'hello', 'agent': self.agent_id, 'sid': self.session_id}
+            if self.token:
+                hello['token'] = self.token
+            self._sock = sock
+            self._reader = sock.makefile('rb')
+            try:
+                sock.sendall(encode_events([hello]))
+                reply = self._read_reply()
+            except OSError:
+                self._close()
+                raise
+            if reply.get('kind') != 'welcome':
+                self._close()
+                self.rejected += 1
+                logging.error(f"アグリゲーターに接続を拒否されました: {reply.get('reason', reply)}"
+                              "（AGGREGATOR_TOKEN を確認してください）")
+                raise ConnectionRefusedError("アグリゲーターに接続を拒否されました")
+        return self._sock
+
+    def _read_reply(self):
+        """アグリゲーターからの応答を1行読む（切断された場合は OSError）"""
+        line = self._reader.readline(MAX_LINE_BYTES)
+        if not line:
+            raise ConnectionResetError("アグリゲーターが接続を閉じました")
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            reply = None
+        if not isinstance(reply, dict):
+            raise ConnectionError(f"アグリゲーターの応答が正しくありません: {line[:100]!r}")
+        return reply
+
+    def _send_batch(self, batch):
+        """バッチを送り、アグリゲーターが受け取ったこと（ack）を確認する"""
+        sock = self._connect()
+        seq = batch[-1]['seq']
+        sock.sendall(encode_events(batch + [{'kind': 'sync', 'seq': seq}]))
+        reply = self._read_reply()
+        if reply.get('kind') != 'ack' or reply.get('seq') != seq:
+            raise ConnectionError(f"アグリゲーターの応答が正しくありません: {reply}")
+
+    def _close(self):
+        if self._reader is not None:
+            try:
+                self._reader.close()
+            except OSError:
+                pass
+            self._reader = None
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _take_batch(self):
+        """送信するイベントを取り出す（たまるか flush_interval が経過するまで待つ）"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: len(self._queue) >= self.batch_size or self._stop.is_set(),
+                timeout=self.flush_interval
+            )
+            count = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            if not batch and time.monotonic() - self._last_sent >= self.heartbeat_interval:
+                batch.append(self._event('heartbeat'))
+            return batch
+
+    def _requeue(self, batch):
+        """送信できなかったバッチをキューの先頭に戻す"""
+        with self._cond:
+            for event in reversed(batch):
+                if len(self._queue) == self._queue.maxlen:
+                    self.dropped += 1
+                    continue
+                self._queue.appendleft(event)
+
+    def _run(self):
+        delay = 1
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._stop.is_set():
+                    break
+                continue
+
+            try:
+                self._send_batch(batch)
+                self.sent += len(batch)
+                self.batches += 1
+                self._last_sent = time.monotonic()
+                delay = 1
+            except OSError as e:
+                self._close()
+                self._requeue(batch)
+                self.reconnects += 1
+                if self._stop.is_set():
+                    remaining = self._stop_deadline - time.monotonic()
+                    if remaining <= 0:
+                        logging.warning(f"アグリゲーターに送信できないまま停止します（未送信 {len(self._queue)}件）")
+                        break
+                    time.sleep(min(delay, remaining))
+                else:
+                    logging.warning(f"アグリゲーターへの送信に失敗しました: {e}（{delay}秒後に再接続）")
+                    self._stop.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def stats(self):
+        """送信件数・バッチ数・破棄件数"""
+        return {
+            'sent': self.sent,
+            'batches': self.batches,
+            'queued': len(self._queue),
+            'dropped': self.dropped,
+            'reconnects': self.reconnects,
+            'rejected': self.rejected,
+        }
+
+
+class _AggregatorHandler(socketserver.StreamRequestHandler):
+    def read_lines(self):
+        """1行ずつ読む（MAX_LINE_BYTES を超える行は読み捨てて b'' を返す）"""
+        while True:
+            line = self.rfile.readline(MAX_LINE_BYTES + 1)
+            if not line:
+                return
+            if len(line) > MAX_LINE_BYTES and not line.endswith(b'\n'):
+                # 行の残りを改行まで読み捨てる
+                while line and not line.endswith(b'\n'):
+                    line = self.rfile.readline(MAX_LINE_BYTES)
+                yield b''
+                continue
+            yield line
+
+    def setup(self):
+        super().setup()
+        # 何も送らない接続がスレッドを占有し続けないよう、受信を待つ時間を制限する
+        self.request.settimeout(self.server.aggregator.read_timeout)
+
+    def reply(self, message):
+        self.wfile.write(encode_events([message]))
+
+    def handle(self):
+        aggregator = self.server.aggregator
+        lines = self.read_lines()
+        try:
+            hello = aggregator.authenticate(next(lines, b''), self.client_address)
+            if hello is None:
+                self.reply({'kind': 'reject', 'reason': 'token'})
+                return
+            agent_id = hello.get('agent')
+            if hello:
+                self.reply({'kind': 'welcome'})
+            for line in lines:
+                response = aggregator.feed_line(line, agent_id)
+                if response is not None:
+                    self.reply(response)
+        except socket.timeout:
+            logging.info(f"{aggregator.read_timeout}秒間受信がないため切断しました: {self.client_address}")
+        except OSError as e:
+            logging.info(f"エージェントとの接続が切れました: {self.client_address} ({e})")
+
+
+# 多数のエージェントが同時に接続しても拒否されないよう、待ち受けキューを大きくする
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        request_queue_size = 256
+else:
+    _UnixServer = None
+
+
+class AggregatorServer:
+    """エージェントからのイベントを受け取り、重複を除いて on_event に渡す
+
+    エージェントのセッションごとに連番を記録して再送された重複イベントを捨て、
+    監視対象の状態が前回と変わらないイベントも捨てる。on_event には
+    (event, previous) が渡される（previous はそれまでの状態、初回は None）。
+    token を指定した場合は、接続の最初の行が同じトークンを含む hello でなければ
+    reject を返して切断する。ループバック以外のアドレスで待ち受ける場合は token が必須。
+    hello を送った接続では、hello のエージェントID以外のイベントは受け付けない。
+    read_timeout 秒間何も届かない接続は切断する（エージェントのハートビートより長くする）。
+    """
+
+    def __init__(self, address, on_event=None, token=None, read_timeout=120):
+        self.family, self.address = parse_address(address)
+        self.on_event = on_event
+        self.token = token or None
+        self.read_timeout = read_timeout
+        self.agents = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.received = 0
+        self.duplicates = 0
+        self.unchanged = 0
+        self.delivered = 0
+        self.errors = 0
+        self.rejected = 0
+
+    @property
+    def listen_address(self):
+        """実際に待ち受けているアドレス（ポート 0 を指定した場合の確認用）"""
+        if self._server is None:
+            return None
+        if self.family == socket.AF_UNIX:
+            return f"unix:{self._server.server_address}"
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        """バックグラウンドスレッドで待ち受けを開始"""
+        if self.token is None and not is_loopback(self.family, self.address):
+            raise ValueError(f"ループバック以外のアドレスで待ち受けるにはトークンの設定が必要です: {self.address}")
+        if self.family == socket.AF_UNIX:
+            if _UnixServer is None:
+                raise OSError("この環境は Unix ソケットに対応していません")
+            # 前回の実行で残ったソケットファイルを削除
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self._server = _UnixServer(self.address, _AggregatorHandler)
+        else:
+            self._server = _TCPServer(self.address, _AggregatorHandler)
+        self._server.aggregator = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="aggregator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if self.family == socket.AF_UNIX and os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def authenticate(self, line, client=None):
+        """接続の最初の行を確認
+
+        hello の内容を返す（hello のない接続は空の dict、トークンが一致しなければ None）。
+        """
+        try:
+            hello = json.loads(line) if line else None
+        except ValueError:
+            hello = None
+        if not isinstance(hello, dict) or hello.get('kind') != 'hello':
+            hello = None
+        if self.token is not None:
+            token = hello.get('token') if hello is not None else None
+            if not isinstance(token, str) or not hmac.compare_digest(token.encode(), self.token.encode()):
+                with self._lock:
+                    self.rejected += 1
+                logging.warning(f"トークンが一致しない接続を拒否しました: {client}")
+                return None
+        if hello is None:
+            if line:
+                # hello を送らない（トークンなしの）エージェントは最初の行からイベントとして扱う
+                self.feed_line(line)
+            return {}
+        if not isinstance(hello.get('agent'), str):
+            with self._lock:
+                self.rejected += 1
+            logging.warning(f"エージェントIDのない hello を拒否しました: {client}")
+            return None
+        return hello
+
+    def feed_line(self, line, agent_id=None):
+        """受信した1行を処理（空行・長すぎる行・JSON でない行はエラーとして数える）
+
+        agent_id を指定した場合は、そのエージェントID以外のイベントをエラーとする。
+        sync には同じ seq の ack を返す（それ以外は None）。
+        """
+        try:
+            event = json.loads(line)
+        except ValueError:
+            with self._lock:
+                self.errors += 1
+            return None
+        if isinstance(event, dict) and event.get('kind') == 'sync':
+            return {'kind': 'ack', 'seq': event.get('seq')}
+        self.handle_event(event, agent_id)
+        return None
+
+    @staticmethod
+    def is_valid_event(event):
+        """エージェントのイベントとして処理できる形か"""
+        if not isinstance(event, dict):
+            return False
+        seq = event.get('seq', 0)
+        return (isinstance(event.get('agent'), str) and
+                isinstance(seq, int) and not isinstance(seq, bool) and
+                isinstance(event.get('target'), (str, type(None))))
+
+    def handle_event(self, event, agent_id=None):
+        """重複・変化なしのイベントを除いて on_event を呼び出す"""
+        if not self.is_valid_event(event) or (agent_id is not None and event['agent'] != agent_id):
+            with self._lock:
+                self.errors += 1
+            return
+        with self._lock:
+            self.received += 1
+            agent = self.agents.get(event.get('agent'))
+            if agent is None or agent['sid'] != event.get('sid'):
+                # 新しいエージェント、またはエージェントが再起動した
+                previous_states = agent['states'] if agent else {}
+                agent = {'sid': event.get('sid'), 'seq': 0, 'states': previous_states}
+                self.agents[event.get('agent')] = agent
+            agent['seen'] = time.monotonic()
+
+            seq = event.get('seq', 0)
+            if seq <= agent['seq']:
+                self.duplicates += 1
+                return
+            agent['seq'] = seq
+            if event.get('kind') != 'state':
+                return
+
+            target = event.get('target')
+            previous = agent['states'].get(target)
+            agent['states'][target] = event.get('running')
+            if previous == event.get('running'):
+                self.unchanged += 1
+                return
+            self.delivered += 1
+
+        if self.on_event is not None:
+            try:
+                self.on_event(event, previous)
+            except Exception as e:
+                logging.error(f"イベント処理エラー: {e}")
+
+    def stale_agents(self, timeout):
+        """timeout 秒以上イベントもハートビートも届いていないエージェント"""
+        now = time.monotonic()
+        with self._lock:
+            return [name for name, agent in self.agents.items() if now - agent['seen'] > timeout]
+
+    def stats(self):
+        """受信・重複・配信件数とエージェント数"""
+        return {
+            'agents': len(self.agents),
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'unchanged': self.unchanged,
+            'delivered': self.delivered,
+            'errors': self.errors,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,116 @@
+import math
+import time
+import logging
+import threading
+
+
+class AdaptiveInterval:
+    """状態に応じてチェック間隔を調整する
+
+    状態が変わった直後（起動直後を含む）の fast_period 秒間は fast 秒間隔で確認し、
+    その後は base 秒間隔に戻す。状態が stable_after 秒以上変わらなければ
+    max_interval まで徐々に間隔を延ばす。また、1回のチェックにかかった時間から
+    CPU 使用率を見積もり、cpu_budget（%）を超えない間隔を下限とする。
+    """
+
+    def __init__(self, base=30, fast=2, max_interval=120, fast_period=60,
+                 stable_after=600, backoff=1.5, cpu_budget=10.0):
+        self.base = base
+        self.fast = min(fast, base)
+        self.max_interval = max(max_interval, base)
+        self.fast_period = fast_period
+        self.stable_after = stable_after
+        self.backoff = backoff
+        self.cpu_budget = cpu_budget
+        self.interval = self.fast
+        self.last_state = None
+        self.last_change = time.monotonic()
+        self.work_time = 0.0
+
+    def reset(self):
+        """状態の変化として扱い、短い間隔に戻す"""
+        self.last_change = time.monotonic()
+        self.interval = self.fast
+
+    def update(self, state, work_time=0.0):
+        """チェック結果を記録して次の待機時間を返す"""
+        now = time.monotonic()
+        self.work_time = work_time
+        if state != self.last_state:
+            self.last_state = state
+            self.last_change = now
+
+        stable_for = now - self.last_change
+        if stable_for < self.fast_period:
+            self.interval = self.fast
+        elif stable_for < self.stable_after:
+            self.interval = self.base
+        else:
+            self.interval = min(max(self.interval, self.base) * self.backoff, self.max_interval)
+
+        return max(self.interval, self.min_interval())
+
+    def min_interval(self):
+        """CPU予算を超えないための最小間隔"""
+        if self.cpu_budget <= 0:
+            return 0.0
+        return self.work_time * (100 / self.cpu_budget - 1)
+
+
+class TickEngine:
+    """monotonic 時計に基づいて一定の周期でティックする
+
+    次のティック時刻は前回の予定時刻から計算するため、処理時間の分だけ
+    周期がずれていくことはない。処理が周期を超えた場合はオーバーランとして記録し、
+    遅れた分のティックは詰めて実行せずに次の予定時刻に合わせる。
+    wake() または wake_event のセットで待機を途中で終了できる。
+    """
+
+    def __init__(self, wake_event=None):
+        self.wake_event = wake_event or threading.Event()
+        self.next_tick = None
+        self.ticks = 0
+        self.overruns = 0
+        self.max_lag = 0.0
+
+    def wait(self, period):
+        """次のティックまで待機（途中で起こされた場合は True）"""
+        now = time.monotonic()
+        if self.next_tick is None:
+            self.next_tick = now
+        self.next_tick += period
+        self.ticks += 1
+
+        if self.next_tick < now:
+            lag = now - self.next_tick
+            self.overruns += 1
+            self.max_lag = max(self.max_lag, lag)
+            logging.warning(f"処理が周期を超えました（{lag:.2f}秒の遅れ、周期 {period:.1f}秒）")
+            skipped = math.ceil(lag / period) if period > 0 else 0
+            self.next_tick += skipped * period
+            if self.next_tick < now:
+                self.next_tick = now
+
+        # Windows でも Ctrl+C に反応できるよう、待機は1秒ごとに区切る
+        while True:
+            remaining = self.next_tick - time.monotonic()
+            if remaining <= 0:
+                return self.wake_event.is_set()
+            if self.wake_event.wait(min(remaining, 1.0)):
+                return True
+
+    def wake(self):
+        """待機中のティックを終了させる（停止要求）"""
+        self.wake_event.set()
+
+    def reset(self):
+        """周期の基準を現在時刻にする（ループの開始時に呼ぶ）"""
+        self.next_tick = time.monotonic()
+
+    def stats(self):
+        """ティック数とオーバーランの回数"""
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'max_lag': round(self.max_lag, 3),
+        }
@@ -0,0 +1,108 @@
+"""
+検出ループの定常状態でのメモリ確保の確認
+
+キャプチャが使い回すバッファ（MssCapture と同じ）へ合成フレームを書き込み、
+FrameChangeGate と TemplateBank による照合を指定回数のティックだけ繰り返す。
+tracemalloc で1ティックあたりの確保ピークと、ウォームアップ後の増加量を計測し、
+どちらかが --max-bytes を超えた場合、またはウォームアップ後に作業用バッファを
+確保し直した場合は、確保の多い箇所を表示して終了コード 1 を返す。
+リポジトリにはテストスイートがないため、この終了コードを CI での確認に使う:
+
+    python benchmarks/bench_allocations.py --width 640 --height 360
+    python benchmarks/bench_allocations.py --width 640 --height 360 --color
+
+    python benchmarks/bench_allocations.py [--ticks 10000] [--width 1280 --height 720] [--color]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_matching import make_frame, make_template
+from vision import FrameChangeGate, TemplateBank
+
+
+def make_frames(width, height, template, color):
+    """認証ダイアログあり・なしのフレーム（毎ティック変化するように3枚用意）"""
+    th, tw = template.shape[:2]
+    frames = [
+        make_frame(width, height, template, (min(width // 3, width - tw), min(height // 4, height - th)), seed=0),
+        make_frame(width, height, template[:0, :0], (0, 0), seed=1),
+        make_frame(width, height, template, (min(width // 5, width - tw), min(height // 3, height - th)), seed=2),
+    ]
+    if not color:
+        frames = [np.ascontiguousarray(frame[:, :, 1]) for frame in frames]
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=10000)
+    parser.add_argument('--warmup', type=int, default=30)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--color', action='store_true', help="BGR のフレームで計測（pyautogui と同じ）")
+    parser.add_argument('--max-bytes', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    template = make_template()
+    frames = make_frames(args.width, args.height, template, args.color)
+    screen = np.empty_like(frames[0])  # キャプチャが使い回すバッファ
+    bank = TemplateBank(scales=(0.8, 1.0, 1.25), coarse_scale=0.5)
+    bank.add('auth', template)
+    gate = FrameChangeGate(change_ratio=0)  # 毎ティック照合する
+    detections = 0
+
+    def tick(i):
+        np.copyto(screen, frames[i % len(frames)])
+        if gate.has_changed(screen):
+            return bank.detect(screen) is not None
+        return False
+
+    for i in range(args.warmup):
+        tick(i)
+    allocations = bank.buffers.allocations
+
+    tracemalloc.start(10)
+    before = tracemalloc.take_snapshot()
+    base = tracemalloc.get_traced_memory()[0]
+    tick_peak = 0
+    start = time.perf_counter()
+    for i in range(args.ticks):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        detections += tick(i)
+        tick_peak = max(tick_peak, tracemalloc.get_traced_memory()[1] - current)
+    elapsed = time.perf_counter() - start
+    growth = tracemalloc.get_traced_memory()[0] - base
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    print(f"フレーム: {screen.shape} {screen.dtype}  ティック数: {args.ticks}  検出: {detections}  "
+          f"{elapsed / args.ticks * 1000:.2f} ms/tick（tracemalloc の計測を含む）")
+    print(f"作業用バッファ: {bank.buffers.nbytes() / 1024 / 1024:.1f} MB  "
+          f"計測中の確保し直し: {bank.buffers.allocations - allocations} 回")
+    print(f"1ティックの確保ピーク: {tick_peak} bytes  ウォームアップ後の増加: {growth} bytes")
+
+    reallocations = bank.buffers.allocations - allocations
+    if reallocations:
+        print(f"NG: ウォームアップ後に作業用バッファを {reallocations} 回確保し直しました")
+    if tick_peak > args.max_bytes or growth > args.max_bytes:
+        print(f"NG: 確保量が上限 {args.max_bytes} bytes を超えました")
+        print("確保の多い箇所:")
+        for stat in after.compare_to(before, 'traceback')[:5]:
+            print(f"  {stat}")
+            for line in stat.traceback.format()[-4:]:
+                print(f"    {line}")
+    if reallocations or tick_peak > args.max_bytes or growth > args.max_bytes:
+        sys.exit(1)
+    print("OK: 定常状態で配列の確保はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+ウィンドウタイトルによる認証画面検出のベンチマーク（Xvfb 上で実行）
+
+このプロセスを監視対象として、_NET_WM_PID を設定したメインウィンドウを作成し、
+途中で「ログイン」のタイトルを持つウィンドウを追加する。AuthWindowDetector が
+追加されたウィンドウだけを検出することを確認し、1ティックあたりの時間を
+画面キャプチャ＋テンプレート照合（従来の毎ティックの処理）と比較する。
+DISPLAY が設定されていなければ Xvfb を起動する（Xvfb が必要）。
+
+    python benchmarks/bench_auth_window.py [--ticks 500] [--size 1920x1080]
+"""
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import argparse
+
+import numpy as np
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_capture import start_xvfb
+from capture import create_capture
+from vision import TemplateBank
+from window_finder import AuthWindowDetector, WindowTracker, _X11Windows
+
+
+class TestWindows:
+    """Xlib で監視対象プロセスのウィンドウを模擬する"""
+
+    def __init__(self):
+        self.x11 = x11 = ctypes.cdll.LoadLibrary(ctypes.util.find_library('X11'))
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XCreateSimpleWindow.restype = ctypes.c_ulong
+        x11.XCreateSimpleWindow.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int, ctypes.c_uint, ctypes.c_uint,
+            ctypes.c_uint, ctypes.c_ulong, ctypes.c_ulong,
+        ]
+        x11.XInternAtom.restype = ctypes.c_ulong
+        x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        x11.XChangeProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+            ctypes.c_void_p, ctypes.c_int,
+        ]
+        x11.XMapWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        x11.XDestroyWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+
+        self.display = x11.XOpenDisplay(None)
+        if not self.display:
+            sys.exit("X ディスプレイに接続できません")
+        self.root = x11.XDefaultRootWindow(self.display)
+
+    def _atom(self, name):
+        return self.x11.XInternAtom(self.display, name.encode(), 0)
+
+    def create(self, title, rect):
+        x, y, w, h = rect
+        window = self.x11.XCreateSimpleWindow(self.display, self.root, x, y, w, h, 0, 0, 0xffffff)
+        pid = ctypes.c_ulong(os.getpid())
+        self.x11.XChangeProperty(self.display, window, self._atom('_NET_WM_PID'), self._atom('CARDINAL'),
+                                 32, 0, ctypes.byref(pid), 1)
+        name = title.encode('utf-8')
+        self.x11.XChangeProperty(self.display, window, self._atom('_NET_WM_NAME'), self._atom('UTF8_STRING'),
+                                 8, 0, name, len(name))
+        self.x11.XMapWindow(self.display, window)
+        self.x11.XSync(self.display, 0)
+        return window
+
+    def destroy(self, window):
+        self.x11.XDestroyWindow(self.display, window)
+        self.x11.XSync(self.display, 0)
+
+    def close(self):
+        self.x11.XCloseDisplay(self.display)
+
+
+def per_tick(func, ticks):
+    start = time.perf_counter()
+    for _ in range(ticks):
+        result = func()
+    return (time.perf_counter() - start) / ticks * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=500)
+    parser.add_argument('--size', default='1920x1080')
+    args = parser.parse_args()
+
+    xvfb = None
+    if not os.environ.get('DISPLAY'):
+        xvfb = start_xvfb(args.size)
+    windows = TestWindows()
+    try:
+        windows.create("TikTok LIVE Studio", (0, 0, 1280, 720))
+        # 列挙間隔を 0 にして、毎ティック列挙し直す最悪の場合を計測する
+        tracker = WindowTracker(psutil.Process().name(), backend=_X11Windows(), refresh_interval=0)
+        detector = AuthWindowDetector(tracker)
+
+        idle_ms, hits = per_tick(detector.check, args.ticks)
+        print(f"DISPLAY={os.environ['DISPLAY']}  ティック数: {args.ticks}")
+        print(f"タイトル検出（認証画面なし） {idle_ms:7.3f} ms/tick  検出: {len(hits)}")
+
+        auth = windows.create("ログイン - TikTok LIVE Studio", (400, 200, 480, 360))
+        hit_ms, hits = per_tick(detector.check, args.ticks)
+        print(f"タイトル検出（認証画面あり） {hit_ms:7.3f} ms/tick  検出: "
+              f"{[(w.title, rule) for w, rule in hits]}")
+        windows.destroy(auth)
+        closed = detector.check()
+        print(f"認証画面を閉じた後の検出: {len(closed)}  統計: {detector.stats()}")
+
+        # 比較: 従来どおり毎ティック画面をキャプチャしてテンプレートを照合する
+        capture = create_capture('auto')
+        bank = TemplateBank(scales=[0.8, 1.0, 1.25])
+        bank.add('auth', np.random.default_rng(0).integers(0, 255, (120, 200), dtype=np.uint8))
+        region = tracker.region()
+
+        def screen_tick():
+            return bank.detect(capture.grab(region))
+
+        try:
+            screen_ms, _ = per_tick(screen_tick, max(args.ticks // 10, 1))
+            print(f"キャプチャ＋テンプレート照合   {screen_ms:7.3f} ms/tick  "
+                  f"({screen_ms / max(idle_ms, 1e-9):.0f} 倍)")
+        finally:
+            capture.close()
+    finally:
+        windows.close()
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+画面キャプチャ方式のベンチマーク（Xvfb 上で実行）
+
+pyautogui（PIL 画像 → numpy → BGR の変換で毎回フレームを確保）と、
+mss で事前確保したバッファへ直接グレースケール化する方式を比較し、
+1フレームあたりの時間と numpy の新規確保量を表示する。
+DISPLAY が設定されていなければ Xvfb を起動する（Xvfb が必要）。
+
+    python benchmarks/bench_capture.py [--frames 200] [--size 1920x1080] [--region x,y,w,h]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture import CAPTURE_BACKENDS
+from vision import parse_roi
+
+
+def start_xvfb(size, display=':99'):
+    """仮想ディスプレイを起動して DISPLAY を設定"""
+    xvfb = shutil.which('Xvfb')
+    if xvfb is None:
+        sys.exit("DISPLAY が設定されておらず、Xvfb も見つかりません（xvfb をインストールしてください）")
+    proc = subprocess.Popen([xvfb, display, '-screen', '0', f"{size}x24", '-nolisten', 'tcp'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1)
+    if proc.poll() is not None:
+        sys.exit(f"Xvfb を起動できませんでした (終了コード {proc.returncode})")
+    return proc
+
+
+def bench(name, frames, region):
+    try:
+        backend = CAPTURE_BACKENDS[name]()
+        backend.grab(region)  # 初回の接続・バッファ確保は計測に含めない
+    except Exception as e:
+        print(f"{name:<10} 使用できません: {e}")
+        return
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame = backend.grab(region)
+    elapsed = time.perf_counter() - start
+
+    # numpy の確保は tracemalloc で追跡できる（PIL・mss 内部の確保は含まない）
+    tracemalloc.start()
+    addresses = set()
+    for _ in range(20):
+        frame = backend.grab(region)
+        addresses.add(frame.ctypes.data)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    backend.close()
+
+    print(f"{name:<10} {elapsed / frames * 1000:7.2f} ms/frame  {frames / elapsed:7.1f} fps  "
+          f"frame={frame.shape} {frame.dtype}  numpy 確保ピーク {peak / 1024 / 1024:6.1f} MB  "
+          f"バッファ再利用={'あり' if len(addresses) == 1 else 'なし'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--region', default='')
+    args = parser.parse_args()
+
+    xvfb = None
+    if not os.environ.get('DISPLAY'):
+        xvfb = start_xvfb(args.size)
+    try:
+        region = parse_roi(args.region)
+        print(f"DISPLAY={os.environ['DISPLAY']}  領域: {region or '全画面'}  フレーム数: {args.frames}")
+        for name in ('pyautogui', 'mss'):
+            bench(name, args.frames, region)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+LINE 通知の配信スループット・遅延ベンチマーク（ネットワーク接続不要）
+
+ローカルのモック LINE サーバーに対して push を繰り返し、接続を使い回す
+PooledRequestsHttpClient と、SDK 既定の RequestsHttpClient を比較する。
+
+    python benchmarks/bench_line_delivery.py [--messages 500] [--workers 4] [--latency-ms 0]
+"""
+import os
+import sys
+import time
+import argparse
+import warnings
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from linebot import LineBotApi
+from linebot.http_client import RequestsHttpClient
+from linebot.models import TextSendMessage
+from line_client import PooledRequestsHttpClient
+from mock_line_server import MockLineServer
+
+
+def percentile(values, ratio):
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def bench(name, server, http_client, messages, workers):
+    api = LineBotApi('dummy-token', endpoint=server.endpoint, http_client=http_client)
+    server.connections.clear()
+
+    def push(i):
+        start = time.perf_counter()
+        api.push_message('U0000', TextSendMessage(text=f"benchmark {i}"))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(push, range(messages)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<8} {messages / elapsed:8.1f} msg/s  "
+          f"p50={percentile(latencies, 0.5) * 1000:6.1f} ms  "
+          f"p95={percentile(latencies, 0.95) * 1000:6.1f} ms  "
+          f"接続数={len(server.connections)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    # SDK v3 の旧 API に対する非推奨警告は計測結果の表示に不要
+    warnings.simplefilter('ignore')
+    server = MockLineServer(latency_ms=args.latency_ms).start()
+    try:
+        print(f"モック LINE API: {server.endpoint}  メッセージ数: {args.messages}  並列数: {args.workers}")
+        bench("default", server, RequestsHttpClient, args.messages, args.workers)
+        bench("pooled", server, partial(PooledRequestsHttpClient, pool_size=args.workers),
+              args.messages, args.workers)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+テンプレートマッチングのベンチマーク
+
+合成した 4K フレームに認証ダイアログ風のテンプレートを埋め込み、
+各モード（全画面 / ROI / ピラミッド / ROI + ピラミッド）の ms/frame を表示する。
+また、複数テンプレートを個別にカラー照合した場合と TemplateBank で
+まとめて照合した場合を比較する。
+
+    python benchmarks/bench_matching.py [--width 3840 --height 2160 --frames 20]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vision import PyramidMatcher, TemplateBank, match_full
+
+
+def make_template(width=420, height=260, title="Log in to TikTok", dark=False):
+    """認証ダイアログ風のテンプレート画像を作成"""
+    background, text = ((30, 30, 30), (235, 235, 235)) if dark else ((245, 245, 245), (20, 20, 20))
+    template = np.full((height, width, 3), background, dtype=np.uint8)
+    cv2.rectangle(template, (0, 0), (width - 1, 40), (40, 40, 40), -1)
+    cv2.putText(template, title, (20, 110),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.0, text, 2)
+    cv2.rectangle(template, (20, 170), (width - 20, 220), (80, 40, 250), -1)
+    cv2.putText(template, "Continue", (150, 205),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+    return template
+
+
+def make_frame(width, height, template, pos, seed=0):
+    """ノイズ背景にテンプレートを埋め込んだフレームを作成"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (9, 9), 0)
+    x, y = pos
+    th, tw = template.shape[:2]
+    frame[y:y + th, x:x + tw] = template
+    return frame
+
+
+def bench(name, func, frames):
+    """関数を繰り返し実行して ms/frame を表示"""
+    func()  # ウォームアップ
+    start = time.perf_counter()
+    for _ in range(frames):
+        result = func()
+    elapsed = (time.perf_counter() - start) * 1000 / frames
+    print(f"{name:<16} {elapsed:8.1f} ms/frame  検出={result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--scale', type=float, default=0.5)
+    args = parser.parse_args()
+
+    template = make_template()
+    pos = (args.width // 2, args.height // 3)
+    frame = make_frame(args.width, args.height, template, pos)
+
+    # LIVE Studio のウィンドウを想定した ROI
+    roi_w, roi_h = min(1280, args.width), min(800, args.height)
+    rx = max(min(pos[0] - 200, args.width - roi_w), 0)
+    ry = max(min(pos[1] - 200, args.height - roi_h), 0)
+    roi = frame[ry:ry + roi_h, rx:rx + roi_w]
+
+    matcher = PyramidMatcher(template, scale=args.scale)
+
+    print(f"フレーム: {args.width}x{args.height}  ROI: {roi_w}x{roi_h}  "
+          f"テンプレート: {template.shape[1]}x{template.shape[0]}")
+    bench("full", lambda: match_full(frame, template)[0] > 0.8, args.frames)
+    bench("roi", lambda: match_full(roi, template)[0] > 0.8, args.frames)
+    bench("pyramid", lambda: matcher.detect(frame), args.frames)
+    bench("roi+pyramid", lambda: matcher.detect(roi), args.frames)
+
+    # 言語・テーマ違いのテンプレート群（最後のものだけが画面に表示されている想定）
+    variants = [
+        make_template(title="Anmelden", dark=True),
+        make_template(title="Iniciar sesion"),
+        make_template(title="Se connecter", dark=True),
+        template,
+    ]
+    bank = TemplateBank(scales=(1.0,), coarse_scale=args.scale)
+    for i, variant in enumerate(variants):
+        bank.add(f"variant{i}", variant)
+
+    def match_each():
+        return any(match_full(roi, variant)[0] > 0.8 for variant in variants)
+
+    print(f"\nテンプレート {len(variants)} 枚（ROI 内）")
+    bench("color x N", match_each, args.frames)
+    bench("bank", lambda: bank.detect(roi) is not None, args.frames)
+
+
+if __name__ == "__main__":
+    main()
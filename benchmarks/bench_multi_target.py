@@ -0,0 +1,59 @@
+"""
+複数の監視対象の検出コストのベンチマーク
+
+見つからない監視対象を N 件用意し（毎回の走査が必要になる最悪ケース）、
+対象ごとに ProcessDetector で走査する場合と、MultiProcessDetector で
+1回の走査にまとめる場合の1ティックあたりの時間を比較する。
+
+    python benchmarks/bench_multi_target.py [--targets 1,4,16] [--rounds 20]
+"""
+import os
+import sys
+import time
+import argparse
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.process_detector import ProcessDetector, MultiProcessDetector
+
+
+def make_detectors(count):
+    return {f"shop-{i}": ProcessDetector(f"TikTokLiveStudio-bench-{i}") for i in range(count)}
+
+
+def bench_separate(count, rounds):
+    detectors = list(make_detectors(count).values())
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for detector in detectors:
+            detector.is_running()
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_combined(count, rounds):
+    detector = MultiProcessDetector(make_detectors(count))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        detector.poll()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', default='1,4,16')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"プロセス数: {len(psutil.pids())}")
+    for count in (int(c) for c in args.targets.split(',')):
+        separate = bench_separate(count, args.rounds)
+        combined = bench_combined(count, args.rounds)
+        print(f"対象 {count:3d} 件  個別走査 {separate * 1000:8.2f} ms/tick  "
+              f"一括走査 {combined * 1000:8.2f} ms/tick  ({separate / combined:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+ネットワーク監視の pcap 再生ベンチマーク（オフラインで実行可能）
+
+合成した pcap ファイルを作成し、PacketScanner による生バイト列の照合と、
+従来方式（scapy で解析して str(packet).lower() を検索）の packets/s を比較する。
+
+    python benchmarks/bench_network.py [--packets 200000] [--skip-scapy]
+"""
+import os
+import sys
+import time
+import struct
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_rules import LogRuleMatcher
+from network_filter import PacketScanner, iter_pcap, scan_pcap
+
+
+def make_packet(payload, src=(192, 168, 0, 10), dst=(203, 0, 113, 5), dport=443):
+    """Ethernet / IPv4 / TCP のパケットを作成"""
+    tcp = struct.pack('!HHIIBBHHH', 50000, dport, 1, 0, 5 << 4, 0x18, 65535, 0, 0)
+    total_length = 20 + len(tcp) + len(payload)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, total_length, 0, 0, 64, 6, 0,
+                     bytes(src), bytes(dst))
+    ether = b'\x00\x11\x22\x33\x44\x55' + b'\x66\x77\x88\x99\xaa\xbb' + b'\x08\x00'
+    return ether + ip + tcp + payload
+
+
+def write_pcap(path, count, match_every=1000, seed=0):
+    """合成パケットを pcap 形式で保存"""
+    rng = random.Random(seed)
+    normal = [bytes(rng.getrandbits(8) for _ in range(size)) for size in (64, 512, 1200, 1400)]
+    auth = b'POST /passport/web/login HTTP/1.1\r\nX-Reason: authentication required\r\n\r\n'
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for i in range(count):
+            payload = auth if i % match_every == 0 else normal[i % len(normal)]
+            packet = make_packet(payload)
+            f.write(struct.pack('<IIII', i // 1000, (i % 1000) * 1000, len(packet), len(packet)))
+            f.write(packet)
+
+
+def bench(name, func, count):
+    start = time.perf_counter()
+    matched = func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {count / elapsed:12.0f} packets/s  ({elapsed:.2f} s)  一致={matched}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--pcap', help='既存の pcap ファイルを使用する')
+    parser.add_argument('--skip-scapy', action='store_true', help='scapy による従来方式の計測を省略')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.pcap
+        if not path:
+            path = os.path.join(tmp_dir, 'synthetic.pcap')
+            write_pcap(path, args.packets)
+        count = sum(1 for _ in iter_pcap(path))
+        print(f"pcap: {path}  パケット数: {count}")
+
+        scanner = PacketScanner(LogRuleMatcher.from_config('authentication=authentication'))
+        bench("raw prefilter", lambda: scan_pcap(path, scanner)['matched'], count)
+
+        if not args.skip_scapy:
+            from scapy.all import Ether
+
+            def scan_scapy():
+                matched = 0
+                for raw in iter_pcap(path):
+                    if "authentication" in str(Ether(raw)).lower():
+                        matched += 1
+                return matched
+
+            bench("scapy dissect", scan_scapy, count)
+
+
+if __name__ == "__main__":
+    main()
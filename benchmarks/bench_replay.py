@@ -0,0 +1,128 @@
+"""
+記録したフレームを使った認証画面検出のオフライン検証
+
+monitor.py で RECORD_FRAMES を指定して記録したアーカイブ（frame_corpus.py）を
+各検出処理に順に渡し、適合率・再現率・ms/frame・確保メモリのピークを表示する。
+--synthetic を指定すると、合成したフレームでアーカイブを作成して検証する
+（テンプレートも合成したものを使うため、画面やテンプレート画像がなくても実行できる）。
+--min-precision / --min-recall を下回った場合は終了コード 1 を返す。
+RECORD_LABEL=auto で記録した（検出結果をラベルにした）アーカイブでは、記録時と同じ
+検出処理の適合率・再現率は 1.0 に近くなり意味がないため、警告を表示する。
+
+    python benchmarks/bench_replay.py corpus.zip [--templates templates]
+    python benchmarks/bench_replay.py --synthetic 60 [--width 1920 --height 1080]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_matching import make_frame, make_template
+from frame_corpus import FrameCorpus, FrameRecorder, replay
+from vision import FrameChangeGate, TemplateBank
+
+
+def record_synthetic(path, count, width, height, template):
+    """認証ダイアログあり・別のダイアログ・何もなしの3種類のフレームを記録"""
+    other = make_template(title="Stream settings", dark=True)
+    rng = np.random.default_rng(0)
+    recorder = FrameRecorder(path, max_frames=count, info={'synthetic': True, 'label_source': 'synthetic'})
+    dialogs = [template, other, other[:0, :0]]  # 最後は何も表示されていないフレーム
+    for i in range(count):
+        dialog = dialogs[i % 3]
+        th, tw = dialog.shape[:2]
+        pos = (int(rng.integers(0, width - tw)), int(rng.integers(0, height - th)))
+        recorder.add(make_frame(width, height, dialog, pos, seed=i), dialog is template)
+    recorder.close()
+    return recorder.stats()
+
+
+def build_pipelines(templates, template_dir, scales):
+    """検出処理（フレーム → 検出したか）の一覧"""
+    def bank(coarse_scale):
+        bank = TemplateBank(scales=scales, coarse_scale=coarse_scale)
+        if template_dir:
+            bank.load_dir(template_dir)
+        for name, image in templates:
+            bank.add(name, image)
+        return bank
+
+    pyramid = bank(0.5)
+    full = bank(1.0)
+    gated_bank = bank(0.5)
+    gate = FrameChangeGate()
+    last = [False]
+
+    def gated(frame):
+        # monitor.py の check_screen と同じく、変化がないフレームは前回の結果を使う
+        if gate.has_changed(frame):
+            last[0] = gated_bank.detect(frame) is not None
+        return last[0]
+
+    return {
+        'pyramid': lambda frame: pyramid.detect(frame) is not None,
+        'full': lambda frame: full.detect(frame) is not None,
+        'gated': gated,
+    }, len(pyramid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='?')
+    parser.add_argument('--templates', default='')
+    parser.add_argument('--synthetic', type=int, default=0)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--scales', default='0.8,1.0,1.25')
+    parser.add_argument('--pipelines', default='pyramid,full,gated')
+    parser.add_argument('--min-precision', type=float, default=0.0)
+    parser.add_argument('--min-recall', type=float, default=0.0)
+    args = parser.parse_args()
+    if not args.corpus and not args.synthetic:
+        parser.error("アーカイブか --synthetic を指定してください")
+
+    templates = []
+    temp_dir = None
+    path = args.corpus
+    if args.synthetic:
+        template = make_template()
+        templates.append(('synthetic', template))
+        if not path:
+            temp_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(temp_dir.name, 'synthetic.zip')
+        stats = record_synthetic(path, args.synthetic, args.width, args.height, template)
+        print(f"合成フレームを記録しました: {path} ({stats})")
+
+    try:
+        corpus = FrameCorpus(path)
+        scales = [float(v) for v in args.scales.split(',') if v.strip()]
+        pipelines, template_count = build_pipelines(templates, args.templates, scales)
+        if not template_count:
+            sys.exit("テンプレートがありません（--templates を指定してください）")
+        labels = corpus.labels()
+        print(f"{path}: {len(labels)} フレーム (認証画面あり {sum(labels)})  テンプレート: {template_count}")
+        if corpus.detector_labeled():
+            print(f"警告: ラベルは記録時の検出結果です（label_source: {corpus.label_source()}）。"
+                  f"記録時と同じ検出処理（{corpus.info.get('match_mode', '不明')}）の適合率・再現率は意味がありません。"
+                  "frame_corpus.py extract / label / reviewed でラベルを確認・修正してください")
+
+        failed = False
+        for name in args.pipelines.split(','):
+            result = replay(corpus, pipelines[name.strip()])
+            print(f"{name:<8} {result.summary()}")
+            if result.misses:
+                print(f"{'':<8} 誤判定のフレーム: {result.misses[:20]}")
+            if result.precision < args.min_precision or result.recall < args.min_recall:
+                failed = True
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
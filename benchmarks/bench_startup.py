@@ -0,0 +1,118 @@
+"""
+起動時間（モジュールの読み込み）のベンチマーク
+
+python -X importtime でエントリーポイントを起動する子プロセスを実行し、
+読み込み時間・起動全体の時間・読み込まれたモジュール数・最大メモリ使用量を比較する。
+monitor.py は main() と同じく監視クラスの作成とテンプレートの読み込みまで
+（最初のティックの直前まで）を計測する。監視クラスの作成時に画像処理の
+モジュールを読み込むため、読み込みだけを計測しても実際の起動時間にはならない。
+app/monitor.py --headless は起動時にそれ以上のモジュールを読み込まないため、読み込みまでを計測する。
+「eager」は GUI・画像処理・通知のバックエンドを起動時にすべて読み込んでいた
+従来の動作を再現したもの（インストールされていないモジュールは読み飛ばす）。
+
+    python benchmarks/bench_startup.py [--runs 5] [--top 8]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 従来はモジュールの読み込み時に読み込まれていたバックエンド
+EAGER_APP = ['plyer.notification', 'pystray', 'PIL.Image', 'setup_gui']
+EAGER_MONITOR = ['cv2', 'numpy', 'pyautogui', 'plyer.notification', 'vision', 'capture',
+                 'linebot', 'linebot.models', 'line_client']
+
+# main() で最初のティックまでに行う処理（監視ループには入らない）
+MONITOR_SETUP = """
+from dotenv import load_dotenv
+load_dotenv()
+app = monitor.TikTokLiveMonitor()
+app.load_templates(os.path.join({root!r}, 'templates'))
+""".format(root=ROOT_DIR)
+
+PROBE = """
+import os, sys, json, time
+started = time.perf_counter()
+sys.path.insert(0, {path!r})
+import {module}
+for name in {eager!r}:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+{setup}
+seconds = time.perf_counter() - started
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    rss = 0
+print(json.dumps({{'modules': len(sys.modules), 'rss': rss, 'seconds': seconds}}))
+"""
+
+SCENARIOS = [
+    ("app/monitor.py --headless", os.path.join(ROOT_DIR, 'app'), 'monitor', [], ''),
+    ("app/monitor.py (eager)", os.path.join(ROOT_DIR, 'app'), 'monitor', EAGER_APP, ''),
+    ("monitor.py", ROOT_DIR, 'monitor', [], MONITOR_SETUP),
+    ("monitor.py (eager)", ROOT_DIR, 'monitor', EAGER_MONITOR, MONITOR_SETUP),
+]
+
+
+def parse_importtime(stderr):
+    """-X importtime の出力から (合計マイクロ秒, [(累計, モジュール名)]) を取り出す"""
+    total = 0
+    top_level = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        cumulative = int(cumulative)
+        name = name[1:]
+        # インデントのないものがトップレベルの import（累計に子の時間を含む）
+        if not name.startswith('  '):
+            total += cumulative
+            top_level.append((cumulative, name.strip()))
+    return total, top_level
+
+
+def measure(path, module, eager, setup, runs):
+    results = []
+    for _ in range(runs):
+        code = PROBE.format(path=path, module=module, eager=eager, setup=setup)
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                              capture_output=True, text=True, cwd=ROOT_DIR)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        total, top_level = parse_importtime(proc.stderr)
+        info = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append((total, top_level, info))
+    # 読み込み時間の中央値の回を採用する
+    results.sort(key=lambda r: r[0])
+    return results[len(results) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+
+    for name, path, module, eager, setup in SCENARIOS:
+        try:
+            total, top_level, info = measure(path, module, eager, setup, args.runs)
+        except RuntimeError as e:
+            print(f"{name:<28} 読み込みに失敗しました: {e}")
+            continue
+        print(f"{name:<28} 読み込み {total / 1000:8.1f} ms  起動 {info['seconds'] * 1000:8.1f} ms  "
+              f"モジュール {info['modules']:5d}  "
+              f"最大メモリ {info['rss']:7.1f} MB")
+        for cumulative, module_name in sorted(top_level, reverse=True)[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {module_name}")
+
+
+if __name__ == "__main__":
+    main()
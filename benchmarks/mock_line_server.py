@@ -0,0 +1,113 @@
+"""
+LINE Messaging API のローカルモックサーバー
+
+push メッセージ（POST /v2/bot/message/push）を受け付けて 200 を返す。
+ネットワークに接続せずに LINE 通知の送信や性能を確認する際に使用する。
+
+    python benchmarks/mock_line_server.py --port 8089 [--latency-ms 50] [--fail-rate 0.1]
+
+    LINE_API_ENDPOINT=http://127.0.0.1:8089 python monitor.py
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLineHandler(BaseHTTPRequestHandler):
+    # keep-alive を有効にする（ヘッダーと本文の書き込みが Nagle で遅延しないようにする）
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        server = self.server
+
+        if self.path != '/v2/bot/message/push':
+            self._reply(404, {'message': 'Not found'})
+            return
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._reply(401, {'message': 'Authentication failed'})
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            self._reply(500, {'message': 'Internal server error'})
+            return
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            self._reply(400, {'message': 'The request body has 1 error(s)'})
+            return
+
+        with server.lock:
+            server.messages.append(data)
+            server.connections.add(self.client_address)
+        self._reply(200, {})
+
+
+class MockLineServer(ThreadingHTTPServer):
+    """受信したメッセージを保持するモックサーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, fail_rate=0.0):
+        super().__init__((host, port), MockLineHandler)
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.messages = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """バックグラウンドスレッドで起動"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockLineServer(args.host, args.port, args.latency_ms, args.fail_rate)
+    print(f"モック LINE API: {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"受信メッセージ数: {len(server.messages)}  接続数: {len(server.connections)}")
+
+
+if __name__ == "__main__":
+    main()
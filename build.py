@@ -32,5 +32,33 @@ def build_exe():
     print("\nビルドが完了しました！")
     print(f"実行ファイル: {os.path.join('dist', 'TikTokStudioMonitor.exe')}")
 
+def build_agent_exe():
+    """ヘッドレスのエージェント用EXEファイルをビルド（GUI・画像処理のモジュールを含めない）"""
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+
+    options = [
+        os.path.join(root_dir, 'app', 'agent.py'),    # 常にヘッドレスで起動するスクリプト
+        '--name=TikTokStudioMonitorAgent',            # 出力ファイル名
+        '--onefile',                                  # 単一のEXEファイルに
+        '--console',                                  # ログをコンソールに表示
+        '--clean',                                    # ビルドディレクトリをクリーン
+
+        # ヘッドレスでは使わないモジュールを除外して展開・起動を速くする
+        '--exclude-module=tkinter',
+        '--exclude-module=setup_gui',
+        '--exclude-module=pystray',
+        '--exclude-module=PIL',
+        '--exclude-module=cv2',
+        '--exclude-module=numpy',
+    ]
+
+    PyInstaller.__main__.run(options)
+
+    print("\nビルドが完了しました！")
+    print(f"実行ファイル: {os.path.join('dist', 'TikTokStudioMonitorAgent.exe')}")
+
 if __name__ == "__main__":
-    build_exe()
+    if '--headless' in sys.argv:
+        build_agent_exe()
+    else:
+        build_exe()
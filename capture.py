@@ -0,0 +1,101 @@
+import logging
+import cv2
+import numpy as np
+
+
+class PyAutoGuiCapture:
+    """pyautogui によるキャプチャ（従来の方式）
+
+    PIL 画像の取得・numpy 配列への変換・BGR への変換で毎回フレームを3枚確保する。
+    """
+
+    name = 'pyautogui'
+
+    def grab(self, region=None):
+        """画面をキャプチャして BGR のフレームを返す"""
+        import pyautogui
+
+        screenshot = pyautogui.screenshot(region=region)
+        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+
+    def close(self):
+        pass
+
+
+class MssCapture:
+    """mss（Linux では X11 の共有メモリ）によるキャプチャ
+
+    取得した BGRA の画素列を numpy のビューとしてコピーせずに参照し、
+    事前に確保したグレースケールのバッファへ直接変換する。領域の大きさが
+    変わらない限りバッファは使い回すため、毎回のフレーム確保は発生しない。
+    返すフレームは次の grab で上書きされるため、保持する場合はコピーすること。
+    """
+
+    name = 'mss'
+
+    def __init__(self):
+        import mss
+
+        self._mss = mss
+        self._sct = None
+        self._frame = None
+
+    def _screen(self):
+        # mss のインスタンスはスレッドをまたいで使えないため、最初に使うスレッドで作成する
+        if self._sct is None:
+            self._sct = self._mss.mss()
+        return self._sct
+
+    def _monitor(self, region):
+        """キャプチャ領域を画面内に収めた mss の領域指定"""
+        monitors = self._screen().monitors
+        if region is None:
+            return dict(monitors[1] if len(monitors) > 1 else monitors[0])
+
+        bounds = monitors[0]
+        x, y, w, h = region
+        left = max(x, bounds['left'])
+        top = max(y, bounds['top'])
+        right = min(x + w, bounds['left'] + bounds['width'])
+        bottom = min(y + h, bounds['top'] + bounds['height'])
+        if right <= left or bottom <= top:
+            raise ValueError(f"キャプチャ領域が画面外です: {region}")
+        return {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+
+    def _buffer(self, height, width):
+        if self._frame is None or self._frame.shape != (height, width):
+            self._frame = np.empty((height, width), dtype=np.uint8)
+        return self._frame
+
+    def grab(self, region=None):
+        """画面をキャプチャしてグレースケールのフレーム（使い回すバッファ）を返す"""
+        monitor = self._monitor(region)
+        shot = self._screen().grab(monitor)
+        height, width = shot.height, shot.width
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self._buffer(height, width))
+
+    def close(self):
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+
+CAPTURE_BACKENDS = {
+    'mss': MssCapture,
+    'pyautogui': PyAutoGuiCapture,
+}
+
+
+def create_capture(name='auto'):
+    """キャプチャ方式を作成（auto は mss が使えれば mss、なければ pyautogui）"""
+    name = (name or 'auto').lower()
+    if name == 'auto':
+        try:
+            return MssCapture()
+        except ImportError:
+            logging.info("mss がインストールされていないため pyautogui でキャプチャします")
+            return PyAutoGuiCapture()
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f"未対応のキャプチャ方式です: {name}")
+    return CAPTURE_BACKENDS[name]()
@@ -0,0 +1,101 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+
+class EventDebouncer:
+    """ファイル変更イベントをまとめてワーカースレッドで処理する
+
+    同じファイルへの変更は最初のイベントから window 秒の間まとめて1回の処理にし、
+    handler はオブザーバースレッドではなくワーカースレッドで呼び出す。
+    待機中のファイルは max_pending 件までで、超えた場合は新しいファイルの
+    イベントを破棄する（オフセットを記録しているため、次の変更時に読まれる）。
+    """
+
+    def __init__(self, handler, window=0.5, max_pending=256):
+        self.handler = handler
+        self.window = window
+        self.max_pending = max_pending
+        self.pending = OrderedDict()  # パス -> 処理予定時刻
+        self.received = 0
+        self.merged = 0
+        self.dropped = 0
+        self.processed = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def submit(self, path):
+        """イベントを受け付ける（オブザーバースレッドから呼ばれる）"""
+        with self._cond:
+            self.received += 1
+            if path in self.pending:
+                self.merged += 1
+                return
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending[path] = time.monotonic() + self.window
+            self._cond.notify()
+
+    def start(self):
+        """ワーカースレッドを開始"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """ワーカースレッドを停止（待機中のイベントは処理してから終了）"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _take_due(self):
+        """処理予定時刻を過ぎたパスを取り出す（ロック内で呼ぶ）"""
+        now = time.monotonic()
+        due = []
+        # 追加順に並んでいるため、先頭から期限切れのものだけを取り出せばよい
+        while self.pending:
+            path, deadline = next(iter(self.pending.items()))
+            if deadline > now and self._running:
+                break
+            del self.pending[path]
+            due.append(path)
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    due = self._take_due()
+                    if due or (not self._running and not self.pending):
+                        break
+                    timeout = None
+                    if self.pending:
+                        timeout = max(next(iter(self.pending.values())) - time.monotonic(), 0)
+                    self._cond.wait(timeout)
+
+            if not due:
+                return
+
+            for path in due:
+                try:
+                    self.handler(path)
+                except Exception as e:
+                    logging.error(f"イベント処理エラー: {e}")
+                self.processed += 1
+
+    def stats(self):
+        """受信したイベント数と処理した回数"""
+        with self._cond:
+            return {
+                'received': self.received,
+                'merged': self.merged,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'pending': len(self.pending),
+            }
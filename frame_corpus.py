@@ -0,0 +1,366 @@
+import os
+import re
+import atexit
+import sys
+import json
+import time
+import zipfile
+import argparse
+import tracemalloc
+from datetime import datetime
+import cv2
+import numpy as np
+
+# フレームは PNG（可逆圧縮）で保存し、ラベルはファイル名に含める（ディレクトリでも zip でも同じ名前）
+# 例: frames/000012-auth.png（認証画面あり） / frames/000013-none.png（なし）
+FRAME_NAME = re.compile(r'^frames/(\d+)-(auth|none)\.png$')
+INFO_NAME = 'corpus.json'
+# corpus.json の label_source: ラベルの付け方（detector は検出結果をそのままラベルにしたもの）
+LABEL_SOURCES = ('manual', 'detector', 'synthetic', 'mixed')
+
+
+def parse_label(value):
+    """ラベルの指定を bool に変換（auto / 空欄は None: 検出結果をラベルにする）"""
+    value = (value or 'auto').strip().lower()
+    if value == 'auto':
+        return None
+    if value in ('1', 'true', 'auth', 'yes'):
+        return True
+    if value in ('0', 'false', 'none', 'no'):
+        return False
+    raise ValueError(f"ラベルの指定が正しくありません: {value}")
+
+
+def frame_name(index, label):
+    return f"frames/{index:06d}-{'auth' if label else 'none'}.png"
+
+
+def write_file(path, data):
+    """一時ファイルに書いてから置き換える（途中で終了しても壊れたファイルを残さない）"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class FrameRecorder:
+    """キャプチャしたフレームをラベル付きで記録する
+
+    path がディレクトリの場合はフレームを1枚ずつ PNG ファイルとして書き込むため、
+    プロセスが強制終了されてもそれまでのフレームはそのまま使える（長時間の記録向け）。
+    .zip で終わる場合は zip アーカイブに書き込む。zip の目次は close で
+    書き込まれるため、通常の終了時には atexit でも close する。
+    info の label_source は corpus.json に記録され、既存のディレクトリに
+    異なる付け方のフレームを追記した場合は mixed になる。
+    フレームは追加した時点で PNG に変換するため、キャプチャのバッファ
+    （次のキャプチャで上書きされるもの）をそのまま渡してよい。
+    """
+
+    def __init__(self, path, max_frames=1000, info=None):
+        self.path = path
+        self.max_frames = max_frames
+        self.info = dict(info or {})
+        self.info.setdefault('created', datetime.now().isoformat(timespec='seconds'))
+        self.zip = None
+        self.start_index = 0
+        if path.lower().endswith('.zip'):
+            self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED)
+        else:
+            os.makedirs(os.path.join(path, 'frames'), exist_ok=True)
+            # 既存の記録には追記する（番号を続ける）
+            indices = [int(m.group(1)) for m in map(FRAME_NAME.match, FrameCorpus.directory_names(path)) if m]
+            self.start_index = max(indices) + 1 if indices else 0
+            if indices:
+                previous = FrameCorpus(path).label_source()
+                if previous != self.info.get('label_source', 'manual'):
+                    self.info['label_source'] = 'mixed'
+        self.closed = False
+        self.count = 0
+        self.labels = {True: 0, False: 0}
+        self.bytes_written = 0
+        atexit.register(self.close)
+
+    @property
+    def full(self):
+        return self.max_frames and self.count >= self.max_frames
+
+    def _write(self, name, data):
+        if self.zip is not None:
+            self.zip.writestr(name, data)
+        else:
+            write_file(os.path.join(self.path, name), data)
+
+    def add(self, frame, label):
+        """フレームを1枚記録（上限に達していれば False）"""
+        if self.closed or self.full:
+            return False
+        ok, encoded = cv2.imencode('.png', frame)
+        if not ok:
+            return False
+        self._write(frame_name(self.start_index + self.count, label), encoded.tobytes())
+        self.count += 1
+        self.labels[bool(label)] += 1
+        self.bytes_written += len(encoded)
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        info = dict(self.info, frames=self.start_index + self.count, auth=self.labels[True])
+        if self.zip is None:
+            # ディレクトリの場合は既存のフレームも含めて数え直す
+            labels = FrameCorpus(self.path).labels()
+            info.update(frames=len(labels), auth=sum(labels))
+        self._write(INFO_NAME, json.dumps(info, ensure_ascii=False, indent=2).encode('utf-8'))
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+
+    def stats(self):
+        return {
+            'frames': self.count,
+            'auth': self.labels[True],
+            'bytes': self.bytes_written,
+        }
+
+
+class FrameCorpus:
+    """記録したフレーム（ディレクトリまたは zip、フレームは読み出すときに1枚ずつ展開する）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_dir = os.path.isdir(path)
+        if self.is_dir:
+            names = self.directory_names(path)
+            info_path = os.path.join(path, INFO_NAME)
+            self.info = {}
+            if os.path.exists(info_path):
+                with open(info_path, 'r', encoding='utf-8') as f:
+                    self.info = json.load(f)
+        else:
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+                self.info = json.loads(archive.read(INFO_NAME)) if INFO_NAME in names else {}
+        entries = []
+        for name in names:
+            m = FRAME_NAME.match(name)
+            if m:
+                entries.append((int(m.group(1)), name, m.group(2) == 'auth'))
+        entries.sort()
+        self.entries = [(name, label) for _, name, label in entries]
+
+    @staticmethod
+    def directory_names(path):
+        """ディレクトリ内のフレームを zip と同じ名前（frames/...）で列挙"""
+        frames_dir = os.path.join(path, 'frames')
+        if not os.path.isdir(frames_dir):
+            return []
+        return [f"frames/{filename}" for filename in os.listdir(frames_dir)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def labels(self):
+        return [label for _, label in self.entries]
+
+    def label_source(self):
+        """ラベルの付け方（記録がない古いアーカイブは manual とみなす）"""
+        return self.info.get('label_source', 'manual')
+
+    def detector_labeled(self):
+        """検出結果をラベルにしたフレームを含むか（その検出処理の精度の評価には使えない）"""
+        return self.label_source() in ('detector', 'mixed')
+
+    def read_entries(self):
+        """(名前, PNG のバイト列, ラベル) を順に返す"""
+        if self.is_dir:
+            for name, label in self.entries:
+                with open(os.path.join(self.path, name), 'rb') as f:
+                    yield name, f.read(), label
+            return
+        with zipfile.ZipFile(self.path) as archive:
+            for name, label in self.entries:
+                yield name, archive.read(name), label
+
+    def frames(self):
+        """(フレーム, ラベル) を順に返す"""
+        for _, data, label in self.read_entries():
+            yield cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED), label
+
+    def pack(self, output, labels=None):
+        """フレームを番号を振り直して zip アーカイブに書き出す（labels で上書き可能）"""
+        temp_path = output + '.tmp'
+        entries = []
+        with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_STORED) as dst:
+            for i, (_, data, label) in enumerate(self.read_entries()):
+                if labels is not None:
+                    label = labels[i]
+                name = frame_name(i, label)
+                dst.writestr(name, data)
+                entries.append((name, label))
+            info = dict(self.info, frames=len(entries), auth=sum(l for _, l in entries))
+            dst.writestr(INFO_NAME, json.dumps(info, ensure_ascii=False, indent=2))
+        os.replace(temp_path, output)
+        return entries, info
+
+    def mark_reviewed(self):
+        """すべてのラベルを確認済み（manual）にする"""
+        self.info = dict(self.info, label_source='manual')
+        if not self.is_dir:
+            self.entries, self.info = self.pack(self.path, self.labels())
+            return
+        write_file(os.path.join(self.path, INFO_NAME),
+                   json.dumps(self.info, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def relabel(self, indices, label):
+        """指定したフレームのラベルを変更する"""
+        indices = set(indices)
+        labels = [label if i in indices else old for i, old in enumerate(self.labels())]
+        if not self.is_dir:
+            self.entries, self.info = self.pack(self.path, labels)
+            return
+        entries = []
+        for (name, _), new_label in zip(self.entries, labels):
+            m = FRAME_NAME.match(name)
+            new_name = frame_name(int(m.group(1)), new_label)
+            if new_name != name:
+                os.replace(os.path.join(self.path, name), os.path.join(self.path, new_name))
+            entries.append((new_name, new_label))
+        self.entries = entries
+        self.info = dict(self.info, frames=len(entries), auth=sum(labels))
+        write_file(os.path.join(self.path, INFO_NAME),
+                   json.dumps(self.info, ensure_ascii=False, indent=2).encode('utf-8'))
+
+
+class ReplayResult:
+    """再生結果の集計（検出精度・1フレームあたりの時間・確保メモリのピーク）"""
+
+    def __init__(self):
+        self.tp = self.fp = self.fn = self.tn = 0
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.misses = []  # 判定を誤ったフレームの番号
+
+    @property
+    def frames(self):
+        return self.tp + self.fp + self.fn + self.tn
+
+    @property
+    def precision(self):
+        return self.tp / (self.tp + self.fp) if self.tp + self.fp else 1.0
+
+    @property
+    def recall(self):
+        return self.tp / (self.tp + self.fn) if self.tp + self.fn else 1.0
+
+    @property
+    def ms_per_frame(self):
+        return self.seconds * 1000 / self.frames if self.frames else 0.0
+
+    def add(self, index, detected, label):
+        if detected and label:
+            self.tp += 1
+        elif detected:
+            self.fp += 1
+        elif label:
+            self.fn += 1
+        else:
+            self.tn += 1
+        if bool(detected) != bool(label):
+            self.misses.append(index)
+
+    def summary(self):
+        return (f"フレーム {self.frames}  適合率 {self.precision:.3f}  再現率 {self.recall:.3f}  "
+                f"(TP {self.tp} / FP {self.fp} / FN {self.fn} / TN {self.tn})  "
+                f"{self.ms_per_frame:.2f} ms/frame  確保ピーク {self.peak_bytes / 1024 / 1024:.1f} MB")
+
+
+def replay(corpus, detect, trace_memory=True):
+    """記録したフレームを検出処理に順に渡して精度と速度を集計する
+
+    detect はフレームを受け取り、認証画面を検出したかを返す関数。
+    時間とメモリはフレームの展開を除いた detect の呼び出しだけを計測する。
+    確保メモリは tracemalloc で追跡できるもの（numpy・OpenCV の出力配列を含む）。
+    """
+    result = ReplayResult()
+    tracing = trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        for index, (frame, label) in enumerate(corpus.frames()):
+            if trace_memory:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            detected = detect(frame)
+            result.seconds += time.perf_counter() - start
+            if trace_memory:
+                result.peak_bytes = max(result.peak_bytes, tracemalloc.get_traced_memory()[1] - base)
+            result.add(index, detected, label)
+    finally:
+        if tracing:
+            tracemalloc.stop()
+    return result
+
+
+def parse_indices(value):
+    """"3,10-20" 形式のフレーム番号の指定を展開"""
+    indices = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        indices.extend(range(int(start), int(end) + 1) if sep else [int(start)])
+    return indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="記録したフレームのアーカイブを確認・ラベル付けする")
+    sub = parser.add_subparsers(dest='command', required=True)
+    info = sub.add_parser('info', help="フレーム数とラベルを表示")
+    info.add_argument('corpus')
+    label = sub.add_parser('label', help="フレームのラベルを変更（例: label corpus.zip 10-20 auth）")
+    label.add_argument('corpus')
+    label.add_argument('frames', help="フレーム番号（例: 3,10-20）")
+    label.add_argument('label', help="auth または none")
+    extract = sub.add_parser('extract', help="フレームを PNG として書き出す（ラベルの確認用）")
+    extract.add_argument('corpus')
+    extract.add_argument('output')
+    reviewed = sub.add_parser('reviewed', help="ラベルを確認・修正し終えたことを記録（検出結果のラベルの警告を消す）")
+    reviewed.add_argument('corpus')
+    pack = sub.add_parser('pack', help="記録したディレクトリを zip アーカイブにまとめる")
+    pack.add_argument('corpus')
+    pack.add_argument('output')
+    args = parser.parse_args()
+
+    corpus = FrameCorpus(args.corpus)
+    if args.command == 'label':
+        value = parse_label(args.label)
+        if value is None:
+            sys.exit("ラベルは auth または none を指定してください")
+        corpus.relabel(parse_indices(args.frames), value)
+    elif args.command == 'reviewed':
+        corpus.mark_reviewed()
+    elif args.command == 'extract':
+        # ファイル名の番号は label で指定するフレーム番号（先頭からの順番）と同じ
+        os.makedirs(args.output, exist_ok=True)
+        for i, (_, data, label) in enumerate(corpus.read_entries()):
+            with open(os.path.join(args.output, os.path.basename(frame_name(i, label))), 'wb') as f:
+                f.write(data)
+        print(f"{len(corpus)} 枚を書き出しました: {args.output}")
+        return
+    elif args.command == 'pack':
+        corpus.pack(args.output)
+        corpus = FrameCorpus(args.output)
+
+    labels = corpus.labels()
+    print(f"{corpus.path}: {len(labels)} フレーム (認証画面あり {sum(labels)})  {corpus.info}")
+    if corpus.detector_labeled():
+        print("注意: ラベルは検出結果です。extract で画像を確認し、label で誤ったラベルを修正してから reviewed を実行してください")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import requests
+from requests.adapters import HTTPAdapter
+from linebot.http_client import HttpClient, RequestsHttpClient, RequestsHttpResponse
+
+
+class PooledRequestsHttpClient(RequestsHttpClient):
+    """接続を keep-alive で使い回す LINE API 用の HTTP クライアント"""
+
+    def __init__(self, timeout=HttpClient.DEFAULT_TIMEOUT, pool_size=4):
+        super(PooledRequestsHttpClient, self).__init__(timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request(self, method, url, timeout, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        response = self.session.request(method, url, timeout=timeout, **kwargs)
+        return RequestsHttpResponse(response)
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        return self._request('GET', url, timeout, headers=headers, params=params, stream=stream)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self._request('POST', url, timeout, headers=headers, data=data)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        return self._request('DELETE', url, timeout, headers=headers, data=data)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        return self._request('PUT', url, timeout, headers=headers, data=data)
@@ -0,0 +1,119 @@
+import re
+
+# 既定の検出ルール（名前=キーワード; 正規表現は re: を付ける）
+DEFAULT_LOG_RULES = 'authentication=authentication;login=login'
+
+
+def parse_rules(value):
+    """"名前=パターン;..." 形式の設定をルールのリストに変換
+
+    パターンは既定で大文字小文字を区別しないキーワードとして扱い、
+    先頭に re: を付けた場合は正規表現として扱う。照合はバイト列のまま行うため、
+    大文字小文字の同一視は ASCII の文字だけ（「Ä」と「ä」などは区別される）。
+    空のパターンや空文字列に一致する正規表現はすべての入力に一致してしまうため、
+    不正な正規表現と同様にルール名を含む ValueError とする。
+    """
+    rules = []
+    for item in value.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, pattern = item.partition('=')
+        if not sep:
+            name, pattern = item, item
+        name = name.strip()
+        pattern = pattern.strip()
+        is_regex = pattern.startswith('re:')
+        if is_regex:
+            pattern = pattern[3:]
+        if not pattern:
+            raise ValueError(f"ルール {name!r} のパターンが空です")
+        if is_regex:
+            try:
+                compiled = re.compile(pattern.encode('utf-8'), re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"ルール {name!r} の正規表現が正しくありません: {e}") from None
+            if compiled.search(b'') is not None:
+                raise ValueError(f"ルール {name!r} の正規表現が空文字列に一致します: {pattern}")
+        rules.append((name, pattern, is_regex))
+    return rules
+
+
+class LogRuleMatcher:
+    """複数の検出ルールをまとめてバイト列のまま照合する
+
+    行ごとのデコードや小文字化は行わず、追記されたチャンク全体を走査する。
+    キーワードはチャンクを一度だけ小文字化して bytes.find で探す（チャンクと同じ
+    bytes.lower で小文字化するため、大文字小文字の同一視は ASCII だけ）。
+    正規表現ルールはルールごとに個別にコンパイルして照合する。1つの正規表現に
+    まとめると、インラインフラグや後方参照の番号が使えず、同じ位置で一致する
+    後のルール（foo と foobar など）が報告されないため。
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.bytes_scanned = 0
+        self.keywords = []  # (小文字化したキーワード, ルール名)
+        self.patterns = []  # (コンパイル済みの正規表現, ルール名)
+        for name, pattern, is_regex in self.rules:
+            if is_regex:
+                self.patterns.append((re.compile(pattern.encode('utf-8'), re.IGNORECASE), name))
+            else:
+                self.keywords.append((pattern.encode('utf-8').lower(), name))
+
+    @classmethod
+    def from_config(cls, value):
+        return cls(parse_rules(value or DEFAULT_LOG_RULES))
+
+    def _find_all(self, data):
+        """各ルールの最初の一致位置（位置, ルール名）を返す"""
+        hits = []
+        if self.keywords:
+            lowered = data.lower()
+            for keyword, name in self.keywords:
+                pos = lowered.find(keyword)
+                if pos >= 0:
+                    hits.append((pos, name))
+        for pattern, name in self.patterns:
+            match = pattern.search(data)
+            if match is not None:
+                hits.append((match.start(), name))
+        hits.sort()
+        return hits
+
+    def search(self, data):
+        """最初に一致したルール名を返す（一致しなければ None）"""
+        self.bytes_scanned += len(data)
+        if not data:
+            return None
+        hits = self._find_all(data)
+        return hits[0][1] if hits else None
+
+    def scan(self, data):
+        """一致したルール名をすべて返す（重複なし、出現順）"""
+        self.bytes_scanned += len(data)
+        if not data:
+            return []
+        fired = []
+        for _, name in self._find_all(data):
+            if name not in fired:
+                fired.append(name)
+        return fired
+
+
+def iter_chunks(f, chunk_size=1 << 20):
+    """バイナリファイルを行の途中で切らないようにチャンク単位で読む"""
+    remainder = b''
+    while True:
+        block = f.read(chunk_size)
+        if not block:
+            break
+        block = remainder + block
+        end = block.rfind(b'\n') + 1
+        if end == 0:
+            remainder = block
+            continue
+        remainder = block[end:]
+        yield block[:end]
+    if remainder:
+        yield remainder
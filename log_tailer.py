@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import logging
+
+
+class LogTailer:
+    """ログファイルの追記分だけを読み込む
+
+    ファイルごとに inode と読み込み済みのバイトオフセットを記録し、
+    次回は新しく追記されたバイトだけを読む。ローテーション（inode の変化）や
+    切り詰め（サイズの縮小）を検知した場合は先頭から読み直す。
+    オフセットは state_path に保存され、再起動後も引き継がれる。
+    """
+
+    def __init__(self, state_path=None, save_interval=5.0):
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self.offsets = self._load_state()
+        self.bytes_read = 0
+        self._dirty = False
+        self._last_save = 0.0
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """オフセットを保存"""
+        if not self.state_path or not self._dirty:
+            return
+        try:
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.offsets, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except OSError as e:
+            logging.error(f"ログオフセットの保存に失敗しました: {e}")
+
+    def _maybe_save(self):
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def _set_offset(self, path, inode, offset):
+        self.offsets[os.path.abspath(path)] = {'inode': inode, 'offset': offset}
+        self._dirty = True
+
+    def prime(self, path):
+        """記録のない既存ファイルは末尾から読み始める（過去のログで通知しない）"""
+        key = os.path.abspath(path)
+        if key in self.offsets:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        self._set_offset(path, stat.st_ino, stat.st_size)
+
+    def read_new(self, path):
+        """前回から追記された完全な行をバイト列で返す"""
+        key = os.path.abspath(path)
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                state = self.offsets.get(key)
+                offset = 0
+                if state is not None and state['inode'] == stat.st_ino and state['offset'] <= stat.st_size:
+                    offset = state['offset']
+                elif state is not None:
+                    logging.info(f"ログのローテーションを検知しました: {path}")
+
+                if offset == stat.st_size:
+                    return b''
+
+                f.seek(offset)
+                data = f.read(stat.st_size - offset)
+        except OSError as e:
+            logging.error(f"ログファイル読み取りエラー: {e}")
+            return b''
+
+        # 書き込み途中の行は次回に回す
+        end = data.rfind(b'\n') + 1
+        data = data[:end]
+        self.bytes_read += len(data)
+        self._set_offset(path, stat.st_ino, offset + end)
+        self._maybe_save()
+        return data
@@ -1,38 +1,216 @@
-import cv2
-import numpy as np
-import pyautogui
 import time
-from plyer import notification
 import os
 from datetime import datetime
 from dotenv import load_dotenv
-from notifiers import NotificationManager
+from notifiers import NotificationDispatcher, NotificationManager
+from app.scheduler import AdaptiveInterval, TickEngine
+from app.metrics import CAPTURE_SECONDS, MATCH_SECONDS, TICK_SECONDS, start_metrics_server
 
 class TikTokLiveMonitor:
     def __init__(self):
-        self.auth_screen_template = None
+        # OpenCV / numpy は読み込みが重いため、モジュールの読み込み時ではなく使用時に読み込む
+        from vision import FrameChangeGate, TemplateBank, TemplateCache, parse_roi
+        from capture import create_capture
+        from window_finder import AuthWindowDetector, TitleWindowTracker, WindowTracker, create_window_backend
+
         self.notification_manager = NotificationManager()
+        self.dispatcher = NotificationDispatcher(
+            self.notification_manager,
+            workers=int(os.getenv('NOTIFICATION_WORKERS', 4)),
+            outbox_path=os.path.expanduser(os.getenv('NOTIFICATION_OUTBOX') or '~/.tiktok_monitor_outbox.json')
+        )
+        self.match_mode = os.getenv('MATCH_MODE', 'pyramid')  # pyramid または full
+        self.match_scale = float(os.getenv('MATCH_SCALE', 0.5))
+        template_scales = os.getenv('TEMPLATE_SCALES', '0.8,1.0,1.25')  # DPI差を吸収する倍率
+        # 前処理済みテンプレートのキャッシュ（空欄で無効）
+        cache_dir = os.path.expanduser(os.getenv('TEMPLATE_CACHE_DIR', '~/.tiktok_monitor_cache'))
+        self.template_bank = TemplateBank(
+            scales=[float(v) for v in template_scales.split(',') if v.strip()],
+            coarse_scale=self.match_scale if self.match_mode == 'pyramid' else 1.0,
+            cache=TemplateCache(cache_dir) if cache_dir else None
+        )
+        self.last_match = None
+        self.roi = parse_roi(os.getenv('CAPTURE_ROI', ''))  # x,y,w,h
+        self.roi_window_title = os.getenv('ROI_WINDOW_TITLE', '')
+        # LIVE Studio のウィンドウ（ダイアログを含む）だけをキャプチャする
+        self.capture_target_window = os.getenv('CAPTURE_TARGET_WINDOW', 'true').lower() == 'true'
+        # auto: ウィンドウを列挙できればタイトルで検出し、画像照合は確認だけに使う / window / screen
+        self.auth_detection = os.getenv('AUTH_DETECTION', 'auto').lower()
+        refresh_interval = float(os.getenv('WINDOW_REFRESH_INTERVAL', 2))
+        window_backend = None
+        if self.roi_window_title or self.capture_target_window or self.auth_detection != 'screen':
+            window_backend = create_window_backend()
+        # タイトル指定のウィンドウ（CAPTURE_TARGET_WINDOW などの設定に関係なく使える）
+        self.title_window_tracker = None
+        if self.roi_window_title:
+            self.title_window_tracker = TitleWindowTracker(self.roi_window_title, backend=window_backend,
+                                                           refresh_interval=refresh_interval)
+        self.window_tracker = None
+        if self.capture_target_window or self.auth_detection != 'screen':
+            self.window_tracker = WindowTracker(
+                os.getenv('TIKTOK_PROCESS_NAME', 'TikTokLiveStudio'),
+                backend=window_backend,
+                refresh_interval=refresh_interval
+            )
+        self.auth_window_detector = None
+        if self.auth_detection != 'screen':
+            if self.window_tracker.backend is not None:
+                self.auth_window_detector = AuthWindowDetector(self.window_tracker, os.getenv('AUTH_WINDOW_RULES'))
+            elif self.auth_detection == 'window':
+                print("警告: ウィンドウを列挙できないため、画面の画像照合で検出します")
+        self.auth_window_confirm = os.getenv('AUTH_WINDOW_CONFIRM', 'true').lower() == 'true'
+        # タイトルで検出できない画面内の認証表示に備えて、この間隔（秒）で画面全体も照合する（0 で無効）
+        self.screen_check_interval = float(os.getenv('SCREEN_CHECK_INTERVAL', 300))
+        self.last_auth_window = None
+        self.confirmed_windows = None  # テンプレートと一致したウィンドウ（handle と矩形）
+        self.unconfirmed_windows = None  # 一致しなかったウィンドウ（描画中の場合があるため照合を続ける）
+        self.frame_gate = FrameChangeGate(
+            step=int(os.getenv('FRAME_SAMPLE_STEP', 8)),
+            change_ratio=float(os.getenv('FRAME_CHANGE_RATIO', 0.005))
+        )
+        # 一致しなかったウィンドウは、内容が変化したときだけ照合し直す
+        self.window_gate = FrameChangeGate(
+            step=int(os.getenv('FRAME_SAMPLE_STEP', 8)),
+            change_ratio=float(os.getenv('FRAME_CHANGE_RATIO', 0.005))
+        )
+        self.last_detection = False
+        # auto: mss が使えれば事前確保したバッファへ直接キャプチャ、なければ pyautogui
+        self.capture = create_capture(os.getenv('CAPTURE_BACKEND', 'auto'))
+        # キャプチャしたフレームをラベル付きで記録する（frame_corpus.py / bench_replay.py でオフライン検証用）
+        # ディレクトリを指定すると1枚ずつファイルに書くため、強制終了されても記録は失われない
+        self.recorder = None
+        self.record_label = None
+        record_path = os.getenv('RECORD_FRAMES', '')
+        if record_path:
+            from frame_corpus import FrameRecorder, parse_label
+
+            self.record_label = parse_label(os.getenv('RECORD_LABEL', 'auto'))
+            self.recorder = FrameRecorder(
+                os.path.expanduser(record_path),
+                max_frames=int(os.getenv('RECORD_MAX_FRAMES', 1000)),
+                info={'match_mode': self.match_mode, 'roi': self.roi,
+                      'label_source': 'detector' if self.record_label is None else 'manual'}
+            )
 
     def load_template(self, template_path):
         """認証画面のテンプレート画像を読み込む"""
         if os.path.exists(template_path):
-            self.auth_screen_template = cv2.imread(template_path)
-            return True
+            return self.template_bank.load_file(template_path)
         return False
 
+    def load_templates(self, template_dir):
+        """テンプレートディレクトリ内の画像をすべて読み込む"""
+        return self.template_bank.load_dir(template_dir)
+
+    def get_capture_region(self):
+        """キャプチャ領域を取得（タイトル指定のウィンドウ > 監視対象プロセスのウィンドウ > 保存済みの矩形 > 全画面）"""
+        if self.title_window_tracker is not None:
+            region = self.title_window_tracker.region()
+            if region is not None:
+                return region
+        if self.capture_target_window and self.window_tracker is not None:
+            region = self.window_tracker.region()
+            if region is not None:
+                return region
+        return self.roi
+
     def capture_screen(self):
-        """画面をキャプチャする"""
-        screenshot = pyautogui.screenshot()
-        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+        """画面をキャプチャする（返すフレームは次のキャプチャで上書きされる場合がある）"""
+        return self.capture.grab(self.get_capture_region())
 
     def detect_auth_screen(self, screen):
         """認証画面を検出する"""
-        if self.auth_screen_template is None:
+        if not self.template_bank:
+            return False
+
+        self.last_match = self.template_bank.detect(screen)
+        return self.last_match is not None
+
+    def check_screen(self, screen):
+        """画面に変化があるときだけ認証画面を照合する"""
+        if self.frame_gate.has_changed(screen):
+            self.last_detection = self.detect_auth_screen(screen)
+        return self.last_detection
+
+    def check_full_screen(self):
+        """キャプチャ領域全体をキャプチャして照合する"""
+        started = time.monotonic()
+        screen = self.capture_screen()
+        captured = time.monotonic()
+        detected = self.check_screen(screen)
+        CAPTURE_SECONDS.observe(captured - started)
+        MATCH_SECONDS.observe(time.monotonic() - captured)
+        self.record_frame(screen, detected)
+        return detected
+
+    def record_frame(self, screen, detected):
+        """記録中ならフレームを保存（RECORD_LABEL=auto のときは検出結果をラベルにする）"""
+        if self.recorder is None:
+            return
+        label = detected if self.record_label is None else self.record_label
+        if not self.recorder.add(screen, label) and self.recorder.full:
+            self.close_recorder()
+
+    def close_recorder(self):
+        """フレームの記録を終了する（それ以外の終了経路では FrameRecorder が atexit で閉じる）"""
+        if self.recorder is None:
+            return
+        self.recorder.close()
+        print(f"フレームの記録を終了しました: {self.recorder.path} ({self.recorder.stats()})")
+        self.recorder = None
+
+    def check_auth_windows(self):
+        """ウィンドウタイトルで認証画面を検出し、テンプレートがあれば画像照合で確認する"""
+        hits = self.auth_window_detector.check()
+        if not hits:
+            self.last_auth_window = None
+            self.confirmed_windows = None
+            self.unconfirmed_windows = None
             return False
+        self.last_auth_window = hits[0]
+        if not self.template_bank or not self.auth_window_confirm:
+            self.last_match = None
+            return True
 
-        result = cv2.matchTemplate(screen, self.auth_screen_template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-        return max_val > 0.8
+        # 一致したウィンドウは、同じ位置に表示されている間は照合をやり直さない
+        windows = frozenset((window.handle, tuple(window.rect)) for window, _ in hits)
+        if self.confirmed_windows == windows:
+            return True
+        # 一致しなかった場合は表示直後（描画途中）の可能性があるため結果を保持せず、
+        # 毎ティック該当するウィンドウの範囲だけをキャプチャし、内容が変わったときに照合し直す
+        from window_finder import union_rect
+
+        if self.unconfirmed_windows != windows:
+            self.window_gate.reset()
+        started = time.monotonic()
+        screen = self.capture.grab(union_rect(window.rect for window, _ in hits))
+        captured = time.monotonic()
+        CAPTURE_SECONDS.observe(captured - started)
+        if not self.window_gate.has_changed(screen):
+            return False
+        detected = self.detect_auth_screen(screen)
+        MATCH_SECONDS.observe(time.monotonic() - captured)
+        self.record_frame(screen, detected)
+        if detected:
+            self.confirmed_windows = windows
+            self.unconfirmed_windows = None
+        else:
+            if self.unconfirmed_windows != windows:
+                print(f"ウィンドウ {hits[0][0].title!r} はテンプレートと一致しませんでした（内容が変わったら照合し直します）")
+            self.confirmed_windows = None
+            self.unconfirmed_windows = windows
+        return detected
+
+    def describe_detection(self):
+        """検出した根拠（ウィンドウタイトル・テンプレート）"""
+        parts = []
+        if self.last_auth_window is not None:
+            window, rule = self.last_auth_window
+            parts.append(f"ウィンドウ: {window.title!r}, ルール: {rule}")
+        match = self.last_match
+        if match is not None:
+            parts.append(f"テンプレート: {match.name}, 倍率: {match.scale}, スコア: {match.score:.2f}")
+        return ', '.join(parts)
 
     def start_monitoring(self, check_interval=30, notification_methods=None):
         """モニタリングを開始"""
@@ -40,47 +218,97 @@ class TikTokLiveMonitor:
             notification_methods = ['desktop']
 
         print("モニタリングを開始しました...")
+        self.dispatcher.start()
+        scheduler = AdaptiveInterval(
+            base=check_interval,
+            fast=float(os.getenv('FAST_CHECK_INTERVAL', 2)),
+            max_interval=float(os.getenv('MAX_CHECK_INTERVAL', 120)),
+            cpu_budget=float(os.getenv('CPU_BUDGET_PERCENT', 10))
+        )
+        ticker = TickEngine()
         last_notification_time = None
         notification_cooldown = 300  # 5分間の通知クールダウン
 
+        tick_seconds = {mode: TICK_SECONDS.labels(mode) for mode in ('screen', 'window')}
+        last_screen_check = None
+        ticker.reset()
         while True:
             try:
-                screen = self.capture_screen()
+                started = time.monotonic()
                 current_time = datetime.now()
+                recorded = self.recorder.count if self.recorder is not None else 0
+                if self.auth_window_detector is None:
+                    mode = 'screen'
+                    detected = self.check_full_screen()
+                else:
+                    # タイトルで見つからないときだけ、一定間隔で画面全体も照合する
+                    mode = 'window'
+                    detected = self.check_auth_windows()
+                    if (not detected and self.screen_check_interval > 0 and self.template_bank and
+                            (last_screen_check is None or
+                             started - last_screen_check >= self.screen_check_interval)):
+                        mode = 'screen'
+                        last_screen_check = started
+                        detected = self.check_full_screen()
+                if self.recorder is not None and mode == 'window' and self.recorder.count == recorded:
+                    # ウィンドウ方式では画面をキャプチャしないティックが多いため、
+                    # 記録中は毎ティックキャプチャ領域を記録する
+                    self.record_frame(self.capture_screen(), detected)
+                finished = time.monotonic()
+                tick_seconds[mode].observe(finished - started)
+                interval = scheduler.update(detected, finished - started)
 
-                if self.detect_auth_screen(screen):
+                if detected:
+                    # クールダウンは壁時計の変更に影響されない monotonic 時計で判定する
                     if (last_notification_time is None or
-                        (current_time - last_notification_time).total_seconds() > notification_cooldown):
+                        started - last_notification_time > notification_cooldown):
 
-                        print(f"認証画面を検出: {current_time}")
+                        print(f"認証画面を検出: {current_time} ({self.describe_detection()})")
 
-                        for method in notification_methods:
-                            self.notification_manager.send_notification(
-                                method,
-                                "TikTok LIVE Studio認証必要",
-                                "TikTok LIVE Studioの再認証が必要です"
-                            )
+                        # 送信はワーカーで行うため監視ループはブロックされない
+                        self.dispatcher.submit(
+                            notification_methods,
+                            "TikTok LIVE Studio認証必要",
+                            "TikTok LIVE Studioの再認証が必要です"
+                        )
 
-                        last_notification_time = current_time
+                        last_notification_time = started
 
-                time.sleep(check_interval)
+                ticker.wait(interval)
 
             except KeyboardInterrupt:
-                print("モニタリングを終了します")
+                print(f"モニタリングを終了します (フレーム判定: {self.frame_gate.stats()}, "
+                      f"ティック: {ticker.stats()})")
+                if self.auth_window_detector is not None:
+                    print(f"ウィンドウタイトルによる検出: {self.auth_window_detector.stats()}")
+                self.capture.close()
+                self.close_recorder()
+                self.dispatcher.stop()
+                print(f"通知統計: {self.dispatcher.stats()}")
                 break
             except Exception as e:
                 print(f"エラーが発生しました: {e}")
-                time.sleep(check_interval)
+                ticker.wait(check_interval)
 
 def main():
     load_dotenv()
+    start_metrics_server(os.getenv('METRICS_ADDRESS'))
 
-    monitor = TikTokLiveMonitor()
-    template_path = os.path.join(os.path.dirname(__file__), 'templates', 'auth_screen.png')
+    try:
+        monitor = TikTokLiveMonitor()
+    except ValueError as e:
+        print(f"エラー: 設定が正しくありません: {e}")
+        return
+    template_dir = os.path.join(os.path.dirname(__file__), 'templates')
 
-    if not monitor.load_template(template_path):
-        print(f"警告: テンプレート画像が見つかりません: {template_path}")
-        print("認証画面のスクリーンショットを templates/auth_screen.png として保存してください")
+    if monitor.load_templates(template_dir):
+        print(f"テンプレートを読み込みました: {', '.join(monitor.template_bank.names())}")
+    elif monitor.auth_window_detector is not None:
+        print(f"警告: テンプレート画像が見つかりません: {template_dir}")
+        print("ウィンドウタイトルだけで認証画面を検出します（画像による確認は行いません）")
+    else:
+        print(f"警告: テンプレート画像が見つかりません: {template_dir}")
+        print("認証画面のスクリーンショットを templates/ に保存してください（例: templates/auth_screen.png）")
         return
 
     # 使用する通知方法を指定
@@ -88,7 +316,7 @@ def main():
 
     # モニタリング開始
     monitor.start_monitoring(
-        check_interval=30,
+        check_interval=int(os.getenv('CHECK_INTERVAL', 30)),
         notification_methods=notification_methods
     )
 
@@ -0,0 +1,148 @@
+import time
+import struct
+import logging
+
+# SOL_PACKET / PACKET_STATISTICS（Linux の AF_PACKET ソケット）
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
+# pcap のマジックナンバーとバイトオーダー（マイクロ秒・ナノ秒形式）
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': '<',
+    b'\xa1\xb2\xc3\xd4': '>',
+    b'\x4d\x3c\xb2\xa1': '<',
+    b'\xa1\xb2\x3c\x4d': '>',
+}
+
+
+def build_bpf(cidrs, ports):
+    """CIDR とポートのリストからカーネルで評価される BPF 式を作成"""
+    clauses = []
+    cidrs = [c.strip() for c in cidrs if c.strip()]
+    ports = [p.strip() for p in ports if p.strip()]
+    if cidrs:
+        clauses.append('(' + ' or '.join(f"net {c}" for c in cidrs) + ')')
+    if ports:
+        clauses.append('(' + ' or '.join(f"tcp port {p}" for p in ports) + ')')
+    return ' and '.join(clauses) or 'ip'
+
+
+class PacketScanner:
+    """パケットの生バイト列をキーワード照合する（scapy での解析前の前段フィルタ）"""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.packets = 0
+        self.bytes = 0
+        self.matched = 0
+        self.throttled = 0.0  # CPU予算のために受信を止めた秒数
+        self.started = time.monotonic()
+
+    def feed(self, raw):
+        """1パケット分のバイト列を照合し、一致したルール名を返す"""
+        self.packets += 1
+        self.bytes += len(raw)
+        rule = self.matcher.search(raw)
+        if rule is not None:
+            self.matched += 1
+        return rule
+
+    def stats(self, kernel_drops=None):
+        """処理したパケット数と秒間パケット数"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'matched': self.matched,
+            'packets_per_sec': round(self.packets / elapsed, 1),
+            'throttled_seconds': round(self.throttled, 1),
+            'kernel_drops': kernel_drops,
+        }
+
+
+def iter_pcap(path):
+    """pcap ファイルからパケットのバイト列を順に読む（解析は行わない）"""
+    with open(path, 'rb') as f:
+        header = f.read(24)
+        if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+            raise ValueError(f"pcap 形式ではありません: {path}")
+        endian = PCAP_MAGIC[header[:4]]
+        record = struct.Struct(endian + 'IIII')
+        while True:
+            record_header = f.read(record.size)
+            if len(record_header) < record.size:
+                return
+            _, _, incl_len, _ = record.unpack(record_header)
+            data = f.read(incl_len)
+            if len(data) < incl_len:
+                return
+            yield data
+
+
+def scan_pcap(path, scanner, on_match=None):
+    """pcap ファイルをまとめて照合する（オフライン解析・ベンチマーク用）"""
+    for raw in iter_pcap(path):
+        rule = scanner.feed(raw)
+        if rule is not None and on_match is not None:
+            on_match(rule, raw)
+    return scanner.stats()
+
+
+def kernel_drops(sock):
+    """カーネルで破棄されたパケット数（取得できない環境では None）"""
+    try:
+        stats = sock.ins.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8)
+        # 取得するたびにカーネル側の値はリセットされる
+        _, drops = struct.unpack('II', stats)
+        return drops
+    except Exception:
+        return None
+
+
+def sniff_raw(bpf, scanner, on_match, stop_event=None, iface=None, stats_interval=60,
+              throttle=None, min_pause=0.05):
+    """BPF で絞り込んだパケットを生バイト列のまま照合する
+
+    照合に一致したパケットだけを on_match に渡すため、scapy による
+    パケット解析は通常行われない。throttle（処理時間 → 延ばした時間、
+    CpuBudget.scale など）を指定すると、延ばした分だけ受信を止めて
+    CPU使用率を抑える。停止は min_pause 秒以上たまってからまとめて行い、
+    その間に届いたパケットはソケットのバッファに残る（あふれた分は kernel_drops に数えられる）。
+    """
+    from scapy.all import conf, MTU
+
+    sock = conf.L2listen(iface=iface, filter=bpf)
+    drops = 0
+    pause = 0.0
+    last_report = time.monotonic()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            # 停止要求を確認できるよう、待ち時間を区切って受信する
+            if sock.select([sock], 1.0):
+                started = time.monotonic()
+                # recv_raw はパケットを解析せずにバイト列を返す
+                _, raw, _ = sock.recv_raw(MTU)
+                if raw:
+                    rule = scanner.feed(raw)
+                    if rule is not None:
+                        on_match(rule, raw)
+                if throttle is not None:
+                    busy = time.monotonic() - started
+                    pause += throttle(busy) - busy
+                    if pause >= min_pause:
+                        scanner.throttled += pause
+                        if stop_event is not None:
+                            stop_event.wait(pause)
+                        else:
+                            time.sleep(pause)
+                        pause = 0.0
+
+            if time.monotonic() - last_report >= stats_interval:
+                dropped = kernel_drops(sock)
+                if dropped is not None:
+                    drops += dropped
+                logging.info(f"ネットワーク監視統計: {scanner.stats(drops)}")
+                last_report = time.monotonic()
+    finally:
+        sock.close()
+    return scanner.stats(drops)
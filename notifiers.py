@@ -1,8 +1,15 @@
 import os
-from plyer import notification
-from linebot import LineBotApi
-from linebot.models import TextSendMessage
-from linebot.exceptions import LineBotApiError
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from functools import partial
+from app.metrics import NOTIFICATION_QUEUE_DEPTH, NOTIFICATION_SECONDS, NOTIFICATIONS
+
+DEFAULT_LINE_API_ENDPOINT = 'https://api.line.me'
+
 
 class NotificationManager:
     def __init__(self):
@@ -16,10 +23,22 @@ class NotificationManager:
         self._line_user_id = os.getenv('LINE_USER_ID')
 
         if line_channel_access_token and self._line_user_id:
-            self._line_bot_api = LineBotApi(line_channel_access_token)
+            # LINE SDK は読み込みが重いため、LINE通知を使う場合だけ読み込む
+            from linebot import LineBotApi
+            from line_client import PooledRequestsHttpClient
+
+            # API の接続先はテスト用のモックサーバーなどに差し替えられる
+            endpoint = os.getenv('LINE_API_ENDPOINT') or DEFAULT_LINE_API_ENDPOINT
+            pool_size = int(os.getenv('NOTIFICATION_WORKERS', 4))
+            self._line_bot_api = LineBotApi(
+                line_channel_access_token,
+                endpoint=endpoint,
+                http_client=partial(PooledRequestsHttpClient, pool_size=pool_size)
+            )
 
     def send_desktop_notification(self, title, message):
         """デスクトップ通知を送信"""
+        from plyer import notification
         notification.notify(
             title=title,
             message=message,
@@ -27,15 +46,18 @@ class NotificationManager:
             timeout=10,
         )
 
-    def send_line_notification(self, title, message):
-        """LINE通知を送信"""
-        if not self._line_bot_api or not self._line_user_id:
+    def send_line_notification(self, title, message, to=None):
+        """LINE通知を送信（to を指定するとその宛先に送る）"""
+        to = to or self._line_user_id
+        if not self._line_bot_api or not to:
             print("LINE通知の設定が完了していません")
             return False
 
+        from linebot.models import TextSendMessage
+        from linebot.exceptions import LineBotApiError
         try:
             self._line_bot_api.push_message(
-                self._line_user_id,
+                to,
                 TextSendMessage(text=f"{title}\n{message}")
             )
             return True
@@ -43,15 +65,389 @@ class NotificationManager:
             print(f"LINE通知の送信に失敗しました: {e}")
             return False
 
-    def send_notification(self, method, title, message):
-        """指定された方法で通知を送信"""
-        notification_methods = {
+    def supported_methods(self):
+        """対応している通知方法"""
+        return {
             'desktop': self.send_desktop_notification,
             'line': self.send_line_notification,
         }
 
+    def is_available(self, method):
+        """通知方法が設定済みで使用できるか"""
+        if method == 'line':
+            return bool(self._line_bot_api and self._line_user_id)
+        return method in self.supported_methods()
+
+    def send_notification(self, method, title, message):
+        """指定された方法で通知を送信"""
+        notification_methods = self.supported_methods()
+
         if method in notification_methods:
             return notification_methods[method](title, message)
         else:
             print(f"未対応の通知方法です: {method}")
-            return False
\ No newline at end of file
+            return False
+
+
+# 配信遅延ヒストグラムのバケット（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class NotificationDispatcher:
+    """通知をキューに入れてワーカースレッドで送信する
+
+    通知方法（チャネル）ごとに別のジョブとして並列に送信し、失敗したものは
+    指数バックオフで再送する。未送信のジョブは outbox ファイルに保存され、
+    再起動後に送信される。監視ループは submit で登録するだけでブロックしない。
+    """
+
+    def __init__(self, manager=None, workers=4, max_queue=100, max_retries=5,
+                 base_delay=2.0, max_delay=300.0, outbox_path=None):
+        self.manager = manager or NotificationManager()
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.outbox_path = outbox_path
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.outbox = {}  # ジョブID -> ジョブ
+        self.latency = {}  # チャネル -> バケットごとの件数
+        self.sent = {}
+        self.failed = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._timers = set()
+        self._running = False
+        # outbox の書き込み中に変更があれば、書き込み中のスレッドがもう一度書き込む
+        self._outbox_dirty = False
+        self._outbox_saving = False
+
+    def start(self):
+        """ワーカーを開始し、前回未送信の通知を再投入"""
+        self._running = True
+        NOTIFICATION_QUEUE_DEPTH.set_function(self.queue.qsize)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"notifier-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        for job in self._load_outbox():
+            with self._lock:
+                self.outbox[job['id']] = job
+            if not self._enqueue(job):
+                # キューに入りきらない分は空くのを待ってから投入する
+                self._schedule_retry(job, self.base_delay)
+
+    def stop(self, timeout=10):
+        """キューに残っている通知を送信してからワーカーを停止"""
+        deadline = time.monotonic() + timeout
+        while not self.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self._running = False
+        with self._lock:
+            timers = list(self._timers)
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        for _ in self._threads:
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._threads = []
+        self._save_outbox()
+
+    def submit(self, methods, title, message):
+        """通知を登録（キューが満杯の場合は破棄して False を返す）"""
+        accepted = True
+        for method in methods:
+            if method not in self.manager.supported_methods():
+                print(f"未対応の通知方法です: {method}")
+                continue
+            if not self.manager.is_available(method):
+                # 設定されていない通知方法は再送しても成功しない
+                print(f"通知方法が設定されていません: {method}")
+                continue
+            job = {
+                'id': uuid.uuid4().hex,
+                'method': method,
+                'title': title,
+                'message': message,
+                'created': time.time(),
+                'attempts': 0,
+            }
+            with self._lock:
+                self.outbox[job['id']] = job
+            if not self._enqueue(job):
+                with self._lock:
+                    self.outbox.pop(job['id'], None)
+                    self.dropped += 1
+                logging.warning(f"通知キューが満杯のため破棄しました: {method} {title}")
+                accepted = False
+        self._save_outbox()
+        return accepted
+
+    def _enqueue(self, job):
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except queue.Full:
+            return False
+
+    def _schedule_retry(self, job, delay):
+        def retry():
+            with self._lock:
+                self._timers.discard(timer)
+            if self._running and not self._enqueue(job):
+                # キューが空くまで待ってから再投入
+                self._schedule_retry(job, self.base_delay)
+
+        timer = threading.Timer(delay, retry)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self._deliver(job)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, job):
+        method = job['method']
+        job['attempts'] += 1
+        try:
+            ok = self.manager.send_notification(method, job['title'], job['message']) is not False
+        except Exception as e:
+            logging.error(f"通知送信エラー ({method}): {e}")
+            ok = False
+
+        if ok:
+            self._record_latency(method, time.time() - job['created'])
+            NOTIFICATIONS.labels(method, 'sent').inc()
+            with self._lock:
+                self.outbox.pop(job['id'], None)
+                self.sent[method] = self.sent.get(method, 0) + 1
+            self._save_outbox()
+            return
+
+        if job['attempts'] > self.max_retries:
+            logging.error(f"通知の再送を中止しました ({method}): {job['title']}")
+            NOTIFICATIONS.labels(method, 'failed').inc()
+            with self._lock:
+                self.outbox.pop(job['id'], None)
+                self.failed[method] = self.failed.get(method, 0) + 1
+            self._save_outbox()
+            return
+
+        delay = min(self.base_delay * (2 ** (job['attempts'] - 1)), self.max_delay)
+        logging.info(f"{delay:.0f}秒後に通知を再送します ({method}, {job['attempts']}回目の失敗)")
+        NOTIFICATIONS.labels(method, 'retried').inc()
+        self._save_outbox()
+        self._schedule_retry(job, delay)
+
+    def _record_latency(self, method, seconds):
+        NOTIFICATION_SECONDS.labels(method).observe(seconds)
+        with self._lock:
+            buckets = self.latency.setdefault(method, [0] * (len(LATENCY_BUCKETS) + 1))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+
+    def _load_outbox(self):
+        if not self.outbox_path:
+            return []
+        try:
+            with open(self.outbox_path, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+            if jobs:
+                logging.info(f"未送信の通知を再送します: {len(jobs)}件")
+            return jobs
+        except (OSError, ValueError):
+            return []
+
+    def _save_outbox(self):
+        """outbox をファイルに保存（ディスクへの書き込みはロックの外で行う）
+
+        他のスレッドが書き込み中なら変更があったことだけを記録して戻り、
+        書き込み中のスレッドが最新の内容でもう一度書き込む。
+        """
+        if not self.outbox_path:
+            return
+        with self._lock:
+            self._outbox_dirty = True
+            if self._outbox_saving:
+                return
+            self._outbox_saving = True
+        while True:
+            with self._lock:
+                if not self._outbox_dirty:
+                    self._outbox_saving = False
+                    return
+                self._outbox_dirty = False
+                jobs = [dict(job) for job in self.outbox.values()]
+            try:
+                tmp_path = self.outbox_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(jobs, f, ensure_ascii=False)
+                os.replace(tmp_path, self.outbox_path)
+            except (OSError, TypeError, ValueError) as e:
+                logging.error(f"未送信通知の保存に失敗しました: {e}")
+
+    def stats(self):
+        """チャネルごとの送信数と配信遅延ヒストグラム"""
+        with self._lock:
+            return {
+                'queued': self.queue.qsize(),
+                'pending': len(self.outbox),
+                'dropped': self.dropped,
+                'sent': dict(self.sent),
+                'failed': dict(self.failed),
+                'latency': {
+                    method: dict(zip([f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"], buckets))
+                    for method, buckets in self.latency.items()
+                },
+            }
+
+
+class AlertAggregator:
+    """短時間に発生したアラートをまとめて1件の通知として送信する
+
+    アラートはキーごとに重複を除き、クールダウンもキーごとに管理するため、
+    種類の異なるアラートが他のアラートのクールダウンで失われることはない。
+    最初のアラートから window 秒の間に届いたものを通知方法ごとに1件のメッセージにまとめる。
+    """
+
+    def __init__(self, dispatcher, window=5.0, cooldown=300, methods=('desktop', 'line')):
+        self.dispatcher = dispatcher
+        self.window = window
+        self.cooldown = cooldown
+        self.methods = tuple(methods)
+        self.pending = {}  # キー -> アラート
+        self.last_sent = {}  # キー -> 最後に送信した時刻
+        self.received = 0
+        self.merged = 0
+        self.suppressed = 0
+        self.digests = 0
+        self._deadline = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def add(self, key, title, message, methods=None):
+        """アラートを登録（クールダウン中のキーは破棄して False を返す）"""
+        with self._cond:
+            self.received += 1
+            now = time.monotonic()
+            last = self.last_sent.get(key)
+            if last is not None and now - last < self.cooldown:
+                self.suppressed += 1
+                return False
+
+            if key in self.pending:
+                self.pending[key]['count'] += 1
+                self.merged += 1
+                return True
+
+            self.pending[key] = {
+                'title': title,
+                'message': message,
+                'methods': tuple(methods or self.methods),
+                'count': 1,
+            }
+            if self._deadline is None:
+                self._deadline = now + self.window
+                self._cond.notify()
+            return True
+
+    def start(self):
+        """まとめ送信のスレッドを開始"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """残っているアラートを送信して停止"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (
+                        self._deadline is None or self._deadline > time.monotonic()):
+                    timeout = None
+                    if self._deadline is not None:
+                        timeout = self._deadline - time.monotonic()
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+            self.flush()
+
+    def _take_pending(self):
+        with self._cond:
+            alerts = self.pending
+            self.pending = {}
+            self._deadline = None
+            now = time.monotonic()
+            for key in alerts:
+                self.last_sent[key] = now
+            return alerts
+
+    def flush(self):
+        """待機中のアラートを通知方法ごとに1件にまとめて送信"""
+        alerts = self._take_pending()
+        if not alerts:
+            return
+
+        methods = []
+        for alert in alerts.values():
+            for method in alert['methods']:
+                if method not in methods:
+                    methods.append(method)
+
+        for method in methods:
+            targets = [alert for alert in alerts.values() if method in alert['methods']]
+            if len(targets) == 1:
+                alert = targets[0]
+                self.dispatcher.submit([method], alert['title'], alert['message'])
+                continue
+
+            lines = []
+            for alert in targets:
+                count = f" (x{alert['count']})" if alert['count'] > 1 else ''
+                lines.append(f"・{alert['title']}: {alert['message']}{count}")
+            self.dispatcher.submit(
+                [method],
+                f"TikTok LIVE Studio アラート ({len(targets)}件)",
+                "\n".join(lines)
+            )
+            self.digests += 1
+
+    def stats(self):
+        """受け付けたアラート数とまとめ・抑制した件数"""
+        with self._cond:
+            return {
+                'received': self.received,
+                'merged': self.merged,
+                'suppressed': self.suppressed,
+                'digests': self.digests,
+                'pending': len(self.pending),
+            }
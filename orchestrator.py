@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+import psutil
+from app.metrics import DETECTOR_UP
+
+
+class CpuBudget:
+    """監視プロセス全体のCPU使用率を予算内に抑える
+
+    定期的にプロセスのCPU使用率を測り、予算を超えていれば各検出処理の
+    待機時間を延ばす係数（factor）を大きくし、下回れば元に戻す。
+    """
+
+    def __init__(self, percent=10.0, max_factor=8.0):
+        self.percent = percent
+        self.max_factor = max_factor
+        self.factor = 1.0
+        self.last_usage = 0.0
+        self._process = psutil.Process()
+        self._process.cpu_percent(None)
+
+    def update(self):
+        """CPU使用率を測定して係数を調整"""
+        self.last_usage = self._process.cpu_percent(None)
+        if self.percent <= 0:
+            return self.factor
+        if self.last_usage > self.percent:
+            self.factor = min(self.factor * 1.5, self.max_factor)
+        else:
+            self.factor = max(self.factor / 1.5, 1.0)
+        return self.factor
+
+    def scale(self, seconds):
+        """予算に応じて延ばした待機時間"""
+        return seconds * self.factor
+
+
+class DetectorOrchestrator:
+    """複数の検出処理をスレッドで同時に実行し、状態を監視する
+
+    各検出処理は stop_event を受け取る関数として登録する。異常終了した
+    検出処理は restart_delay 秒後に再起動する。
+    """
+
+    def __init__(self, cpu_budget=None, restart_delay=60, health_interval=300):
+        self.cpu_budget = cpu_budget
+        self.restart_delay = restart_delay
+        self.health_interval = health_interval
+        self.stop_event = threading.Event()
+        self.detectors = {}
+
+    def add(self, name, target):
+        """検出処理を登録"""
+        self.detectors[name] = {
+            'target': target,
+            'thread': None,
+            'state': 'pending',
+            'error': None,
+            'restarts': 0,
+            'failed_at': None,
+        }
+
+    def _run_detector(self, name):
+        detector = self.detectors[name]
+        try:
+            detector['target'](self.stop_event)
+            detector['state'] = 'stopped'
+            DETECTOR_UP.labels(name).set(0)
+        except Exception as e:
+            logging.error(f"検出処理が異常終了しました ({name}): {e}")
+            detector['state'] = 'failed'
+            DETECTOR_UP.labels(name).set(0)
+            detector['error'] = str(e)
+            detector['failed_at'] = time.monotonic()
+
+    def _start_detector(self, name):
+        detector = self.detectors[name]
+        detector['state'] = 'running'
+        DETECTOR_UP.labels(name).set(1)
+        detector['error'] = None
+        detector['thread'] = threading.Thread(
+            target=self._run_detector, args=(name,), name=f"detector-{name}", daemon=True
+        )
+        detector['thread'].start()
+
+    def start(self):
+        """登録したすべての検出処理を開始"""
+        for name in self.detectors:
+            logging.info(f"検出処理を開始します: {name}")
+            self._start_detector(name)
+
+    def supervise(self):
+        """CPU予算の調整と異常終了した検出処理の再起動"""
+        if self.cpu_budget is not None:
+            self.cpu_budget.update()
+
+        now = time.monotonic()
+        for name, detector in self.detectors.items():
+            if detector['state'] == 'failed' and now - detector['failed_at'] >= self.restart_delay:
+                detector['restarts'] += 1
+                logging.info(f"検出処理を再起動します: {name} ({detector['restarts']}回目)")
+                self._start_detector(name)
+
+    def health(self):
+        """検出処理ごとの状態"""
+        report = {
+            name: {
+                'state': detector['state'],
+                'restarts': detector['restarts'],
+                'error': detector['error'],
+            }
+            for name, detector in self.detectors.items()
+        }
+        if self.cpu_budget is not None:
+            report['cpu'] = {
+                'usage': self.cpu_budget.last_usage,
+                'budget': self.cpu_budget.percent,
+                'factor': round(self.cpu_budget.factor, 2),
+            }
+        return report
+
+    def stop(self, timeout=10):
+        """すべての検出処理に停止を要求して終了を待つ"""
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for name, detector in self.detectors.items():
+            thread = detector['thread']
+            if thread is not None:
+                thread.join(max(deadline - time.monotonic(), 0))
+                if thread.is_alive():
+                    logging.warning(f"検出処理が時間内に終了しませんでした: {name}")
+
+    def run(self):
+        """検出処理を開始し、Ctrl+C まで監視を続ける"""
+        self.start()
+        last_report = time.monotonic()
+        try:
+            while not self.stop_event.wait(1):
+                self.supervise()
+                if time.monotonic() - last_report >= self.health_interval:
+                    logging.info(f"検出処理の状態: {self.health()}")
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            logging.info("モニタリングを終了します")
+        finally:
+            self.stop()
+            logging.info(f"検出処理の状態: {self.health()}")
@@ -1,81 +1,188 @@
 import os
+import json
 import time
-import psutil
 import logging
-from datetime import datetime
 from plyer import notification
 from dotenv import load_dotenv
+from app.process_detector import ProcessDetector, MultiProcessDetector
+from app.process_watcher import ProcessExitWatcher
+from app.scheduler import AdaptiveInterval, TickEngine
+from app.metrics import PROCESS_SCAN_SECONDS, TARGET_RUNNING, TICK_SECONDS, start_metrics_server
 
-class SimpleMonitor:
-    def __init__(self):
-        self.process_name = os.getenv('TIKTOK_PROCESS_NAME', 'TikTokLiveStudio')
-        self.check_interval = int(os.getenv('CHECK_INTERVAL', 30))
+
+class MonitorTarget:
+    """監視対象ごとの状態・クールダウン・通知先"""
+
+    def __init__(self, name, process_name, cmdline=None, exact=False,
+                 methods=('desktop',), cooldown=300, line_user_id=None):
+        self.name = name
+        self.detector = ProcessDetector(process_name, exact=exact, cmdline=cmdline)
+        self.methods = list(methods)
+        self.cooldown = cooldown
+        self.line_user_id = line_user_id
+        self.last_status = None
         self.last_notification_time = None
-        self.notification_cooldown = int(os.getenv('NOTIFICATION_COOLDOWN', 300))
 
     def should_notify(self):
         """通知クールダウンチェック"""
         if self.last_notification_time is None:
             return True
 
-        time_diff = (datetime.now() - self.last_notification_time).total_seconds()
-        return time_diff > self.notification_cooldown
+        # 壁時計の変更に影響されないよう monotonic 時計で比較する
+        time_diff = time.monotonic() - self.last_notification_time
+        return time_diff > self.cooldown
 
-    def send_notification(self, title, message):
-        """デスクトップ通知を送信"""
-        if not self.should_notify():
+
+def load_targets(path, process_name, cooldown):
+    """監視対象の一覧を読み込む（ファイルがなければ process_name の1件）
+
+    ファイルは次の形式の JSON 配列:
+        [{"name": "shop-a", "process": "TikTokLiveStudio", "cmdline": "--profile=a",
+          "methods": ["desktop", "line"], "line_user_id": "U...", "cooldown": 300}]
+    name は対象ごとに一意でなければならない（重複していれば ValueError）。
+    """
+    if not path:
+        return [MonitorTarget(process_name, process_name, cooldown=cooldown)]
+
+    with open(os.path.expanduser(path), encoding='utf-8') as f:
+        entries = json.load(f)
+
+    targets = []
+    names = set()
+    for i, entry in enumerate(entries):
+        name = entry.get('name') or f"target-{i + 1}"
+        if name in names:
+            raise ValueError(f"監視対象の名前が重複しています: {name} ({path})")
+        names.add(name)
+        targets.append(MonitorTarget(
+            name=name,
+            process_name=entry.get('process', process_name),
+            cmdline=entry.get('cmdline'),
+            exact=entry.get('exact', False),
+            methods=entry.get('methods', ['desktop']),
+            cooldown=entry.get('cooldown', cooldown),
+            line_user_id=entry.get('line_user_id'),
+        ))
+    return targets
+
+
+class SimpleMonitor:
+    def __init__(self):
+        self.process_name = os.getenv('TIKTOK_PROCESS_NAME', 'TikTokLiveStudio')
+        self.check_interval = int(os.getenv('CHECK_INTERVAL', 30))
+        self.notification_cooldown = int(os.getenv('NOTIFICATION_COOLDOWN', 300))
+        self.targets = load_targets(os.getenv('MONITOR_TARGETS_FILE'),
+                                    self.process_name, self.notification_cooldown)
+        self.detector = MultiProcessDetector(((t.name, t.detector) for t in self.targets),
+                                             on_scan=PROCESS_SCAN_SECONDS.observe)
+        # 終了イベントの待機は監視対象が1件のときのみ（複数の場合はポーリング）
+        self.watch_exit = (os.getenv('WATCH_PROCESS_EXIT', 'true').lower() == 'true'
+                           and len(self.targets) == 1)
+        self.watcher = ProcessExitWatcher()
+        self.scheduler = AdaptiveInterval(
+            base=self.check_interval,
+            fast=float(os.getenv('FAST_CHECK_INTERVAL', 2)),
+            max_interval=float(os.getenv('MAX_CHECK_INTERVAL', 120)),
+            cpu_budget=float(os.getenv('CPU_BUDGET_PERCENT', 10))
+        )
+        self.ticker = TickEngine()
+        self._notification_manager = None
+
+    @property
+    def notification_manager(self):
+        """LINE通知用のマネージャー（LINE に通知する対象があるときだけ読み込む）"""
+        if self._notification_manager is None:
+            from notifiers import NotificationManager
+            self._notification_manager = NotificationManager()
+        return self._notification_manager
+
+    def send_notification(self, target, title, message):
+        """監視対象の通知先に通知を送信"""
+        if not target.should_notify():
             return
 
-        try:
-            notification.notify(
-                title=title,
-                message=message,
-                app_icon=None,
-                timeout=10
-            )
-            self.last_notification_time = datetime.now()
+        sent = False
+        for method in target.methods:
+            try:
+                if method == 'desktop':
+                    notification.notify(
+                        title=title,
+                        message=message,
+                        app_icon=None,
+                        timeout=10
+                    )
+                    sent = True
+                elif method == 'line':
+                    sent = self.notification_manager.send_line_notification(
+                        title, message, to=target.line_user_id
+                    ) or sent
+                else:
+                    logging.warning(f"未対応の通知方法です: {method}")
+            except Exception as e:
+                logging.error(f"通知送信エラー ({target.name}, {method}): {e}")
+
+        if sent:
+            target.last_notification_time = time.monotonic()
             logging.info(f"通知を送信しました: {title}")
-        except Exception as e:
-            logging.error(f"通知送信エラー: {e}")
 
-    def is_process_running(self):
-        """プロセスが実行中かチェック"""
-        for proc in psutil.process_iter(['name']):
-            try:
-                if self.process_name.lower() in proc.info['name'].lower():
-                    return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return False
+    def check_targets(self):
+        """すべての監視対象の状態 {対象名: 実行中か}"""
+        return self.detector.poll()
+
+    def wait_for_exit(self):
+        """プロセスの終了をイベントで待機"""
+        detector = self.targets[0].detector
+        self.watcher.watch(detector.pid, detector.create_time)
+        while not self.watcher.wait(1):
+            if not self.watcher.is_watching():
+                break
 
     def start_monitoring(self):
         """モニタリングを開始"""
-        logging.info(f"モニタリングを開始します... (プロセス名: {self.process_name})")
-        last_status = None
+        names = ', '.join(t.name for t in self.targets)
+        logging.info(f"モニタリングを開始します... (監視対象: {names})")
+        tick_seconds = TICK_SECONDS.labels('simple')
+        running_gauges = {t.name: TARGET_RUNNING.labels(t.name) for t in self.targets}
+        self.ticker.reset()
 
         while True:
             try:
-                current_status = self.is_process_running()
+                started = time.monotonic()
+                statuses = self.check_targets()
+                work_time = time.monotonic() - started
+                tick_seconds.observe(work_time)
+                interval = self.scheduler.update(tuple(statuses.values()), work_time)
 
-                # ステータス変更を検知
-                if last_status is not None and last_status != current_status:
-                    if not current_status:
-                        self.send_notification(
-                            "TikTok LIVE Studio アラート",
-                            "アプリケーションが終了しました。認証が必要な可能性があります。"
-                        )
-                    else:
-                        logging.info("アプリケーションが再起動されました")
+                # ステータス変更を対象ごとに検知
+                for target in self.targets:
+                    current_status = statuses[target.name]
+                    running_gauges[target.name].set(int(current_status))
+                    if target.last_status is not None and target.last_status != current_status:
+                        if not current_status:
+                            self.send_notification(
+                                target,
+                                f"TikTok LIVE Studio アラート ({target.name})",
+                                "アプリケーションが終了しました。認証が必要な可能性があります。"
+                            )
+                        else:
+                            logging.info(f"アプリケーションが再起動されました ({target.name})")
+                    target.last_status = current_status
 
-                last_status = current_status
-                time.sleep(self.check_interval)
+                # PIDが分かっていれば終了イベントを待ち、なければポーリング
+                if self.watch_exit and all(statuses.values()):
+                    self.wait_for_exit()
+                    self.ticker.reset()
+                else:
+                    self.ticker.wait(interval)
 
             except KeyboardInterrupt:
-                logging.info("モニタリングを終了します")
+                self.watcher.cancel()
+                logging.info(f"モニタリングを終了します (検出統計: {self.detector.stats()}, "
+                             f"ティック: {self.ticker.stats()})")
                 break
             except Exception as e:
                 logging.error(f"モニタリングエラー: {e}")
-                time.sleep(self.check_interval)
+                self.ticker.wait(self.check_interval)
 
 def main():
     # 環境変数の読み込み
@@ -87,9 +194,16 @@ def main():
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
 
+    # メトリクスの公開（METRICS_ADDRESS が設定されている場合のみ）
+    start_metrics_server(os.getenv('METRICS_ADDRESS'))
+
     # モニタリング開始
-    monitor = SimpleMonitor()
+    try:
+        monitor = SimpleMonitor()
+    except ValueError as e:
+        logging.error(f"監視対象の設定が正しくありません: {e}")
+        return
     monitor.start_monitoring()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,465 @@
+import os
+import json
+import hashlib
+import logging
+from collections import namedtuple
+import cv2
+import numpy as np
+
+TEMPLATE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def parse_roi(value):
+    """"x,y,w,h" 形式の文字列を領域タプルに変換"""
+    if not value:
+        return None
+    try:
+        x, y, w, h = (int(v) for v in value.split(','))
+    except ValueError:
+        return None
+    if w <= 0 or h <= 0:
+        return None
+    return (x, y, w, h)
+
+
+class BufferPool:
+    """照合の出力（結果行列・グレースケール化・縮小したフレーム）のバッファを使い回す
+
+    バッファは用途ごとに1つだけ持ち、要求された形状より小さい場合だけ
+    大きく確保し直して、その先頭部分のビューを返す。形状が揃った定常状態では
+    ティックごとの配列の確保は発生しない。返したビューは同じ用途の次の要求で
+    上書きされるため、スレッドをまたいで共有しないこと。
+    """
+
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0
+
+    def get(self, key, shape, dtype=np.float32):
+        """shape の大きさのバッファ（ビュー）を返す"""
+        buffer = self.buffers.get(key)
+        if buffer is not None and buffer.dtype == dtype and buffer.ndim == len(shape):
+            if all(have >= need for have, need in zip(buffer.shape, shape)):
+                return buffer[tuple([slice(0, n) for n in shape])]
+            shape = tuple([max(have, need) for have, need in zip(buffer.shape, shape)])
+        buffer = self.buffers[key] = np.empty(shape, dtype=dtype)
+        self.allocations += 1
+        return buffer
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+def match_full(screen, template, buffers=None, key='result'):
+    """フル解像度でテンプレートマッチング（最大スコアと位置を返す）
+
+    buffers を渡すと結果行列をそのバッファに書き込み、毎回の確保を避ける。
+    """
+    if screen.shape[0] < template.shape[0] or screen.shape[1] < template.shape[1]:
+        return 0.0, None
+    result = None
+    if buffers is not None:
+        result = buffers.get(key, (screen.shape[0] - template.shape[0] + 1,
+                                   screen.shape[1] - template.shape[1] + 1))
+    result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED, result=result)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def shrink(screen, scale, buffers=None, key='small'):
+    """フレームを縮小する（照合の粗探索用、buffers を渡すとそのバッファに書き込む）"""
+    if buffers is None:
+        return cv2.resize(screen, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height, width = screen.shape[:2]
+    size = (int(round(width * scale)), int(round(height * scale)))
+    dst = buffers.get(key, (size[1], size[0]) + screen.shape[2:], dtype=screen.dtype)
+    return cv2.resize(screen, size, dst=dst, interpolation=cv2.INTER_AREA)
+
+
+class PyramidMatcher:
+    """縮小画像で候補を探し、最良候補の周辺だけをフル解像度で確認する
+
+    scale が 1.0 以上の場合は粗探索を行わずフル解像度で照合する。
+    結果行列は buffers（複数の照合器で共有してよい）に書き込んで使い回す。
+    """
+
+    def __init__(self, template, scale=0.5, threshold=0.8, coarse_margin=0.15, small_template=None,
+                 buffers=None):
+        self.template = template
+        self.scale = scale
+        self.threshold = threshold
+        self.coarse_threshold = threshold - coarse_margin
+        if small_template is None and scale < 1.0:
+            small_template = shrink(template, scale)
+        self.small_template = small_template if scale < 1.0 else None
+        self.buffers = buffers if buffers is not None else BufferPool()
+        # 縮小による位置ずれを吸収する余白（フル解像度のピクセル数）
+        self.pad = int(round(2 / scale)) + 2
+
+    def match(self, screen):
+        """認証画面らしき領域を探す（最大スコアと位置を返す）"""
+        small_screen = None
+        if self.small_template is not None:
+            small_screen = shrink(screen, self.scale, self.buffers, 'small_screen')
+        return self.match_prepared(screen, small_screen)
+
+    def match_prepared(self, screen, small_screen):
+        """縮小済みのフレームを使って照合する（複数テンプレートで共有する場合）"""
+        if self.small_template is None or small_screen is None:
+            return match_full(screen, self.template, self.buffers, 'full_result')
+
+        coarse_val, coarse_loc = match_full(small_screen, self.small_template, self.buffers, 'coarse_result')
+        if coarse_loc is None or coarse_val < self.coarse_threshold:
+            return coarse_val, None
+
+        th, tw = self.template.shape[:2]
+        x = int(coarse_loc[0] / self.scale)
+        y = int(coarse_loc[1] / self.scale)
+        x0 = max(x - self.pad, 0)
+        y0 = max(y - self.pad, 0)
+        x1 = min(x + tw + self.pad, screen.shape[1])
+        y1 = min(y + th + self.pad, screen.shape[0])
+
+        max_val, max_loc = match_full(screen[y0:y1, x0:x1], self.template, self.buffers, 'fine_result')
+        if max_loc is None:
+            return max_val, None
+        return max_val, (x0 + max_loc[0], y0 + max_loc[1])
+
+    def detect(self, screen):
+        """しきい値を超える一致があるか"""
+        max_val, _ = self.match(screen)
+        return max_val > self.threshold
+
+
+TemplateMatch = namedtuple('TemplateMatch', ['name', 'scale', 'score', 'loc'])
+
+
+class TemplateBank:
+    """複数の認証画面テンプレートをまとめて照合する
+
+    テンプレートは読み込み時にグレースケール化と拡大縮小を済ませておき、
+    照合時はフレームを一度だけ前処理して全テンプレートで共有する。
+    前処理したフレームと結果行列は全テンプレートで共有するバッファに書き込むため、
+    定常状態では照合ごとの配列の確保は発生しない。
+    """
+
+    def __init__(self, scales=(1.0,), coarse_scale=0.5, threshold=0.8, cache=None):
+        self.scales = tuple(scales)
+        self.coarse_scale = coarse_scale
+        self.threshold = threshold
+        self.cache = cache
+        self.entries = []  # (テンプレート名, 倍率, PyramidMatcher)
+        self.buffers = BufferPool()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        """読み込み済みのテンプレート名"""
+        return sorted({name for name, _, _ in self.entries})
+
+    def build_variants(self, image):
+        """全倍率の前処理済みテンプレートを作成（倍率, テンプレート, 縮小版）"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        variants = []
+        for scale in self.scales:
+            if scale == 1.0:
+                scaled = gray
+            else:
+                interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+                scaled = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+            small = shrink(scaled, self.coarse_scale) if self.coarse_scale < 1.0 else None
+            variants.append((scale, scaled, small))
+        return variants
+
+    def add_variants(self, name, variants):
+        """前処理済みのテンプレートを追加"""
+        for scale, template, small in variants:
+            matcher = PyramidMatcher(template, scale=self.coarse_scale,
+                                     threshold=self.threshold, small_template=small,
+                                     buffers=self.buffers)
+            self.entries.append((name, scale, matcher))
+
+    def add(self, name, image):
+        """テンプレートを追加（全倍率の前処理をここで行う）"""
+        self.add_variants(name, self.build_variants(image))
+
+    def load_file(self, path):
+        """画像ファイルをテンプレートとして読み込む（キャッシュがあれば再利用）"""
+        name = os.path.basename(path)
+        if self.cache is not None:
+            variants = self.cache.load(path, self.scales, self.coarse_scale)
+            if variants is not None:
+                self.add_variants(name, variants)
+                return True
+
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return False
+        variants = self.build_variants(image)
+        if self.cache is not None:
+            self.cache.store(path, self.scales, self.coarse_scale, variants)
+        self.add_variants(name, variants)
+        return True
+
+    def load_dir(self, template_dir):
+        """ディレクトリ内の画像をすべて読み込む（読み込んだ枚数を返す）"""
+        if not os.path.isdir(template_dir):
+            return 0
+        count = 0
+        for filename in sorted(os.listdir(template_dir)):
+            if filename.lower().endswith(TEMPLATE_EXTENSIONS):
+                if self.load_file(os.path.join(template_dir, filename)):
+                    count += 1
+        return count
+
+    def prepare(self, screen):
+        """フレームの前処理（グレースケール化と縮小）"""
+        gray = screen
+        if screen.ndim == 3:
+            dst = self.buffers.get('gray', screen.shape[:2], dtype=np.uint8)
+            gray = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY, dst=dst)
+        small = shrink(gray, self.coarse_scale, self.buffers, 'small_screen') if self.coarse_scale < 1.0 else None
+        return gray, small
+
+    def match(self, screen):
+        """全テンプレートを照合し、一致したもの（なければ最高スコアのもの）を返す"""
+        if not self.entries:
+            return None
+
+        gray, small = self.prepare(screen)
+        best = None
+        for name, scale, matcher in self.entries:
+            score, loc = matcher.match_prepared(gray, small)
+            if loc is not None and score > self.threshold:
+                return TemplateMatch(name, scale, score, loc)
+            if best is None or score > best.score:
+                best = TemplateMatch(name, scale, score, loc)
+        return best
+
+    def detect(self, screen):
+        """いずれかのテンプレートが一致した場合、その結果を返す"""
+        result = self.match(screen)
+        if result is not None and result.loc is not None and result.score > self.threshold:
+            return result
+        return None
+
+
+class TemplateCache:
+    """前処理済みテンプレートのディスクキャッシュ
+
+    テンプレートごとに倍率別の配列を .npy で保存し、起動時は mmap で読み込む。
+    キャッシュはファイルの SHA-1 と更新時刻で管理し、テンプレートが
+    変更された場合のみ作り直す。
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, index_path)
+
+    @staticmethod
+    def file_hash(path):
+        """テンプレートファイルの SHA-1"""
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @staticmethod
+    def _params(scales, coarse_scale):
+        return {'scales': list(scales), 'coarse_scale': coarse_scale}
+
+    def _lookup(self, path, scales, coarse_scale):
+        """有効なキャッシュエントリを返す（なければ None）"""
+        entry = self.index.get(os.path.abspath(path))
+        if entry is None or entry.get('params') != self._params(scales, coarse_scale):
+            return None
+
+        stat = os.stat(path)
+        if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry
+
+        # 更新時刻だけが変わった場合は内容を比較する
+        if entry['sha1'] != self.file_hash(path):
+            return None
+        entry['mtime_ns'] = stat.st_mtime_ns
+        entry['size'] = stat.st_size
+        self._save_index()
+        return entry
+
+    def load(self, path, scales, coarse_scale):
+        """キャッシュ済みのテンプレートを mmap で読み込む"""
+        try:
+            entry = self._lookup(path, scales, coarse_scale)
+            if entry is None:
+                return None
+
+            variants = []
+            for scale, full_file, small_file in entry['arrays']:
+                template = np.load(os.path.join(self.cache_dir, full_file), mmap_mode='r')
+                small = None
+                if small_file:
+                    small = np.load(os.path.join(self.cache_dir, small_file), mmap_mode='r')
+                variants.append((scale, template, small))
+            return variants
+        except (OSError, ValueError, KeyError) as e:
+            # 壊れたキャッシュは削除し、呼び出し元で作り直す
+            logging.warning(f"テンプレートキャッシュの読み込みに失敗しました（作り直します）: {e}")
+            self._invalidate(path)
+            return None
+
+    def _invalidate(self, path):
+        """テンプレートのキャッシュエントリとファイルを削除"""
+        entry = self.index.get(os.path.abspath(path))
+        if entry is None:
+            return
+        try:
+            self._remove_arrays(entry)
+        except (TypeError, ValueError, KeyError):
+            pass
+        del self.index[os.path.abspath(path)]
+        try:
+            self._save_index()
+        except OSError as e:
+            logging.warning(f"テンプレートキャッシュの保存に失敗しました: {e}")
+
+    def store(self, path, scales, coarse_scale, variants):
+        """前処理済みのテンプレートを保存"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            key = os.path.abspath(path)
+            sha1 = self.file_hash(path)
+            self._remove_arrays(self.index.get(key))
+
+            arrays = []
+            for scale, template, small in variants:
+                prefix = f"{sha1}_{scale:g}"
+                full_file = f"{prefix}_full.npy"
+                self._save_array(full_file, template)
+                small_file = None
+                if small is not None:
+                    small_file = f"{prefix}_coarse{coarse_scale:g}.npy"
+                    self._save_array(small_file, small)
+                arrays.append([scale, full_file, small_file])
+
+            stat = os.stat(path)
+            self.index[key] = {
+                'sha1': sha1,
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'params': self._params(scales, coarse_scale),
+                'arrays': arrays,
+            }
+            self._save_index()
+        except OSError as e:
+            logging.warning(f"テンプレートキャッシュの保存に失敗しました: {e}")
+
+    def _save_array(self, filename, array):
+        """配列を一時ファイルに書いてから置き換える（途中で終了しても壊れたファイルを残さない）"""
+        array_path = os.path.join(self.cache_dir, filename)
+        tmp_path = array_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, array_path)
+
+    def _remove_arrays(self, entry):
+        """古いキャッシュファイルを削除"""
+        if not entry:
+            return
+        in_use = {
+            f for key_entry in self.index.values() if key_entry is not entry
+            for _, full_file, small_file in key_entry['arrays']
+            for f in (full_file, small_file) if f
+        }
+        for _, full_file, small_file in entry['arrays']:
+            for f in (full_file, small_file):
+                if f and f not in in_use:
+                    try:
+                        os.remove(os.path.join(self.cache_dir, f))
+                    except OSError:
+                        pass
+
+
+class FrameChangeGate:
+    """前回照合したフレームからの変化を間引きサンプリングで判定する
+
+    変化がなければ前回の検出結果を再利用できるため、照合自体を省略できる。
+    change_ratio を 0 にすると常に「変化あり」となる。
+    """
+
+    def __init__(self, step=8, pixel_threshold=24, change_ratio=0.005):
+        self.step = step
+        self.pixel_threshold = pixel_threshold
+        self.change_ratio = change_ratio
+        self.previous = None
+        # サンプル・差分・しきい値判定の作業用バッファ（形状が変わるまで使い回す）
+        self.sample = None
+        self.diff = None
+        self.mask = None
+        self.checks = 0
+        self.skips = 0
+
+    def reset(self):
+        """比較対象のフレームを破棄"""
+        self.previous = None
+
+    def _scratch(self, view):
+        """サンプルと同じ形状の作業用バッファを用意する"""
+        if self.sample is None or self.sample.shape != view.shape or self.sample.dtype != view.dtype:
+            self.sample = np.empty_like(view)
+            self.diff = np.empty_like(view)
+            self.mask = np.empty(view.shape[:2], dtype=np.uint8)
+            self.previous = None
+
+    def has_changed(self, frame):
+        """前回照合したフレームから意味のある変化があるか"""
+        self.checks += 1
+        view = frame[::self.step, ::self.step]
+        self._scratch(view)
+        # キャプチャ側がバッファを使い回す場合に備え、サンプルは必ずコピーして保持する
+        np.copyto(self.sample, view)
+        if self.previous is None:
+            self.previous, self.sample = self.sample, np.empty_like(self.sample)
+            return True
+
+        diff = cv2.absdiff(self.sample, self.previous, dst=self.diff)
+        if diff.ndim == 3:
+            diff = np.max(diff, axis=2, out=self.mask)
+        cv2.compare(diff, self.pixel_threshold, cv2.CMP_GT, dst=self.mask)
+        changed = cv2.countNonZero(self.mask) / self.mask.size
+        if changed < self.change_ratio:
+            self.skips += 1
+            return False
+
+        # 今回のサンプルを比較対象にし、前回のバッファを次のサンプルに使う
+        self.previous, self.sample = self.sample, self.previous
+        return True
+
+    def skip_ratio(self):
+        """照合を省略できた割合"""
+        if self.checks == 0:
+            return 0.0
+        return self.skips / self.checks
+
+    def stats(self):
+        """判定回数と省略回数"""
+        return {
+            'checks': self.checks,
+            'skips': self.skips,
+            'skip_ratio': round(self.skip_ratio(), 3),
+        }
@@ -0,0 +1,394 @@
+import sys
+import time
+import ctypes
+import ctypes.util
+import logging
+from collections import namedtuple
+import psutil
+from app.process_detector import ProcessDetector
+from log_rules import LogRuleMatcher, parse_rules
+
+# rect は (x, y, w, h)
+WindowInfo = namedtuple('WindowInfo', ['handle', 'pid', 'title', 'rect'])
+
+# 認証画面とみなすウィンドウタイトルの既定ルール（log_rules と同じ "名前=パターン;..." 形式）
+DEFAULT_AUTH_WINDOW_RULES = 'login=login;login=log in;login=ログイン;sign_in=sign in;auth=authenticat;auth=認証;verify=verif'
+
+
+class _Win32Windows:
+    """Win32 API によるウィンドウの列挙"""
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        self.wintypes = wintypes
+        self.user32 = ctypes.windll.user32
+        self.enum_proc = ctypes.WINFUNCTYPE(ctypes.c_bool, wintypes.HWND, wintypes.LPARAM)
+        try:
+            # キャプチャ（mss）と座標系を合わせるため、DPI スケーリングの影響を受けない座標を使う
+            ctypes.windll.shcore.SetProcessDpiAwareness(2)
+        except (AttributeError, OSError):
+            pass
+
+    def rect(self, handle):
+        """ウィンドウの画面上の矩形（最小化・非表示・破棄済みなら None）"""
+        user32 = self.user32
+        if not user32.IsWindow(handle) or not user32.IsWindowVisible(handle) or user32.IsIconic(handle):
+            return None
+        rect = self.wintypes.RECT()
+        if not user32.GetWindowRect(handle, ctypes.byref(rect)):
+            return None
+        return (rect.left, rect.top, rect.right - rect.left, rect.bottom - rect.top)
+
+    def title(self, handle):
+        length = self.user32.GetWindowTextLengthW(handle)
+        buffer = ctypes.create_unicode_buffer(length + 1)
+        self.user32.GetWindowTextW(handle, buffer, length + 1)
+        return buffer.value
+
+    def list(self):
+        """表示中のトップレベルウィンドウ（ダイアログを含む）"""
+        windows = []
+
+        def callback(handle, _):
+            rect = self.rect(handle)
+            if rect is not None:
+                pid = self.wintypes.DWORD()
+                self.user32.GetWindowThreadProcessId(handle, ctypes.byref(pid))
+                windows.append(WindowInfo(handle, pid.value, self.title(handle), rect))
+            return True
+
+        self.user32.EnumWindows(self.enum_proc(callback), 0)
+        return windows
+
+
+class _XWindowAttributes(ctypes.Structure):
+    _fields_ = [
+        ('x', ctypes.c_int), ('y', ctypes.c_int),
+        ('width', ctypes.c_int), ('height', ctypes.c_int),
+        ('border_width', ctypes.c_int), ('depth', ctypes.c_int),
+        ('visual', ctypes.c_void_p), ('root', ctypes.c_ulong),
+        ('class_', ctypes.c_int), ('bit_gravity', ctypes.c_int),
+        ('win_gravity', ctypes.c_int), ('backing_store', ctypes.c_int),
+        ('backing_planes', ctypes.c_ulong), ('backing_pixel', ctypes.c_ulong),
+        ('save_under', ctypes.c_int), ('colormap', ctypes.c_ulong),
+        ('map_installed', ctypes.c_int), ('map_state', ctypes.c_int),
+        ('all_event_masks', ctypes.c_long), ('your_event_mask', ctypes.c_long),
+        ('do_not_propagate_mask', ctypes.c_long), ('override_redirect', ctypes.c_int),
+        ('screen', ctypes.c_void_p),
+    ]
+
+
+_IS_VIEWABLE = 2
+
+
+class _X11Windows:
+    """X11（EWMH の _NET_CLIENT_LIST / _NET_WM_PID）によるウィンドウの列挙"""
+
+    def __init__(self, display=None):
+        path = ctypes.util.find_library('X11')
+        if path is None:
+            raise OSError("libX11 が見つかりません")
+        x11 = self.x11 = ctypes.cdll.LoadLibrary(path)
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XInternAtom.restype = ctypes.c_ulong
+        x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        x11.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long, ctypes.c_long,
+            ctypes.c_int, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_void_p),
+        ]
+        x11.XGetWindowAttributes.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XWindowAttributes),
+        ]
+        x11.XQueryTree.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_void_p),
+            ctypes.POINTER(ctypes.c_uint),
+        ]
+        x11.XTranslateCoordinates.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong),
+        ]
+        x11.XFree.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+
+        # 破棄済みのウィンドウを参照したときに Xlib の既定のハンドラがプロセスを終了させないようにする
+        self._error_handler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)(
+            lambda display, event: 0
+        )
+        x11.XSetErrorHandler(self._error_handler)
+
+        self.display = x11.XOpenDisplay(display.encode() if display else None)
+        if not self.display:
+            raise OSError("X ディスプレイに接続できません")
+        self.root = x11.XDefaultRootWindow(self.display)
+        self.atoms = {name: x11.XInternAtom(self.display, name.encode(), 0) for name in (
+            '_NET_CLIENT_LIST', '_NET_WM_PID', '_NET_WM_NAME', 'UTF8_STRING',
+            'WM_NAME', '_NET_WM_STATE', '_NET_WM_STATE_HIDDEN',
+        )}
+
+    def _property(self, window, name, length=1024):
+        """ウィンドウのプロパティ（format 32 は整数のリスト、format 8 は bytes）"""
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        status = self.x11.XGetWindowProperty(
+            self.display, window, self.atoms[name], 0, length, 0, 0,
+            ctypes.byref(actual_type), ctypes.byref(actual_format), ctypes.byref(nitems),
+            ctypes.byref(bytes_after), ctypes.byref(data)
+        )
+        if status != 0 or not data.value:
+            return None
+        try:
+            if actual_format.value == 32:
+                # format 32 のデータは C の long の配列として返される
+                return list((ctypes.c_long * nitems.value).from_address(data.value))
+            if actual_format.value == 8:
+                return ctypes.string_at(data.value, nitems.value)
+            return None
+        finally:
+            self.x11.XFree(data)
+
+    def rect(self, handle):
+        """ウィンドウの画面上の矩形（非表示・最小化・破棄済みなら None）"""
+        attributes = _XWindowAttributes()
+        if not self.x11.XGetWindowAttributes(self.display, handle, ctypes.byref(attributes)):
+            return None
+        if attributes.map_state != _IS_VIEWABLE or attributes.width <= 0 or attributes.height <= 0:
+            return None
+        state = self._property(handle, '_NET_WM_STATE') or []
+        if self.atoms['_NET_WM_STATE_HIDDEN'] in state:
+            return None
+        abs_x, abs_y, child = ctypes.c_int(), ctypes.c_int(), ctypes.c_ulong()
+        if not self.x11.XTranslateCoordinates(self.display, handle, self.root, 0, 0,
+                                              ctypes.byref(abs_x), ctypes.byref(abs_y),
+                                              ctypes.byref(child)):
+            return None
+        return (abs_x.value, abs_y.value, attributes.width, attributes.height)
+
+    def title(self, handle):
+        name = self._property(handle, '_NET_WM_NAME') or self._property(handle, 'WM_NAME') or b''
+        return name.decode('utf-8', 'replace')
+
+    def pid(self, handle):
+        pids = self._property(handle, '_NET_WM_PID', 1)
+        return pids[0] if pids else None
+
+    def _children(self):
+        """ルートウィンドウの子（ウィンドウマネージャーがいない環境用）"""
+        root, parent = ctypes.c_ulong(), ctypes.c_ulong()
+        children, count = ctypes.c_void_p(), ctypes.c_uint()
+        if not self.x11.XQueryTree(self.display, self.root, ctypes.byref(root), ctypes.byref(parent),
+                                   ctypes.byref(children), ctypes.byref(count)):
+            return []
+        if not children.value:
+            return []
+        try:
+            return list((ctypes.c_ulong * count.value).from_address(children.value))
+        finally:
+            self.x11.XFree(children)
+
+    def list(self):
+        """トップレベルウィンドウ（ダイアログを含む）
+
+        ウィンドウマネージャーがいれば EWMH の _NET_CLIENT_LIST を使い、
+        いない環境（Xvfb など）ではルートウィンドウの子を調べる。
+        """
+        handles = self._property(self.root, '_NET_CLIENT_LIST')
+        if handles is None:
+            handles = self._children()
+        windows = []
+        for handle in handles:
+            rect = self.rect(handle)
+            if rect is not None:
+                windows.append(WindowInfo(handle, self.pid(handle), self.title(handle), rect))
+        return windows
+
+
+def create_window_backend():
+    """この環境でウィンドウを列挙する方法（対応していなければ None）"""
+    try:
+        if sys.platform == 'win32':
+            return _Win32Windows()
+        if sys.platform.startswith('linux'):
+            return _X11Windows()
+    except OSError as e:
+        logging.info(f"ウィンドウの列挙を使用できません: {e}")
+    return None
+
+
+def union_rect(rects):
+    """複数の矩形を囲む矩形"""
+    rects = list(rects)
+    if not rects:
+        return None
+    left = min(r[0] for r in rects)
+    top = min(r[1] for r in rects)
+    right = max(r[0] + r[2] for r in rects)
+    bottom = max(r[1] + r[3] for r in rects)
+    return (left, top, right - left, bottom - top)
+
+
+class WindowTracker:
+    """監視対象プロセスのウィンドウ（ダイアログを含む）の位置を追跡する
+
+    プロセスは ProcessDetector（PIDキャッシュ付き）で特定し、そのプロセスと
+    子プロセスが所有するウィンドウを列挙する。列挙は refresh_interval 秒ごとに
+    行い、その間は既知のウィンドウの矩形だけを取得し直すため、移動や
+    リサイズには毎回追従しつつ、ティックごとのコストは小さく抑えられる。
+    """
+
+    def __init__(self, process_name, backend=None, refresh_interval=2.0):
+        self.detector = ProcessDetector(process_name)
+        self.backend = backend if backend is not None else create_window_backend()
+        self.refresh_interval = refresh_interval
+        self.windows = []
+        self.last_refresh = None
+        self.refresh_count = 0
+
+    def _pids(self):
+        """監視対象プロセスと子プロセスの PID"""
+        if not self.detector.is_running():
+            return set()
+        pids = {self.detector.pid}
+        try:
+            pids.update(child.pid for child in psutil.Process(self.detector.pid).children(recursive=True))
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return pids
+
+    def refresh(self):
+        """ウィンドウを列挙し直す"""
+        self.refresh_count += 1
+        self.last_refresh = time.monotonic()
+        pids = self._pids()
+        self.windows = [w for w in self.backend.list() if w.pid in pids] if pids else []
+        return self.windows
+
+    def current_windows(self):
+        """監視対象のウィンドウ（列挙の間隔内は既知のウィンドウの位置だけ更新）"""
+        if self.backend is None:
+            return []
+        stale = self.last_refresh is None or time.monotonic() - self.last_refresh >= self.refresh_interval
+        if not stale:
+            windows = []
+            for window in self.windows:
+                rect = self.backend.rect(window.handle)
+                if rect is None:
+                    # 閉じられたウィンドウがあれば列挙し直す
+                    stale = True
+                    break
+                windows.append(window._replace(rect=rect))
+            if not stale:
+                self.windows = windows
+                return windows
+        return self.refresh()
+
+    def region(self):
+        """監視対象のウィンドウ全体を囲むキャプチャ領域（見つからなければ None）"""
+        return union_rect(w.rect for w in self.current_windows())
+
+    def stats(self):
+        return {
+            'windows': len(self.windows),
+            'refreshes': self.refresh_count,
+        }
+
+
+class TitleWindowTracker:
+    """タイトルに指定した文字列を含むウィンドウの位置を追跡する（ROI_WINDOW_TITLE 用）
+
+    WindowTracker と同じく、列挙は refresh_interval 秒ごとに行い、その間は
+    見つけたウィンドウの矩形だけを取得し直す。見つからない間も列挙は
+    refresh_interval 秒ごとにしか行わない。
+    """
+
+    def __init__(self, title, backend=None, refresh_interval=2.0):
+        self.title = title
+        self.backend = backend if backend is not None else create_window_backend()
+        self.refresh_interval = refresh_interval
+        self.handle = None
+        self.last_refresh = None
+        self.refresh_count = 0
+
+    def refresh(self):
+        """ウィンドウを列挙し直して、タイトルが一致するウィンドウの矩形を返す"""
+        self.refresh_count += 1
+        self.last_refresh = time.monotonic()
+        self.handle = None
+        for window in self.backend.list():
+            if self.title in window.title:
+                self.handle = window.handle
+                return window.rect
+        return None
+
+    def region(self):
+        """タイトルが一致するウィンドウの矩形（見つからなければ None）"""
+        if self.backend is None:
+            return None
+        stale = self.last_refresh is None or time.monotonic() - self.last_refresh >= self.refresh_interval
+        if not stale:
+            if self.handle is None:
+                return None
+            rect = self.backend.rect(self.handle)
+            if rect is not None:
+                return rect
+            # 閉じられた・最小化されたウィンドウは列挙し直す
+        return self.refresh()
+
+    def stats(self):
+        return {
+            'found': self.handle is not None,
+            'refreshes': self.refresh_count,
+        }
+
+
+class AuthWindowDetector:
+    """監視対象プロセスのウィンドウタイトルから認証画面を検出する
+
+    LIVE Studio のログイン・再認証の画面は、認識しやすいタイトルを持つ
+    新しいトップレベルのウィンドウとして表示されることが多い。画面の
+    キャプチャや画像照合を行わず、WindowTracker が列挙したウィンドウの
+    タイトルをルールと照合するだけなので、ティックごとのコストは小さい。
+    新しいウィンドウは WindowTracker の列挙間隔（refresh_interval）以内に検出される。
+    """
+
+    def __init__(self, tracker, rules=None):
+        self.tracker = tracker
+        self.matcher = LogRuleMatcher(parse_rules(rules or DEFAULT_AUTH_WINDOW_RULES))
+        self.known = {}  # 検出中のウィンドウ: handle -> ルール名
+        self.check_count = 0
+        self.appeared_count = 0
+
+    def check(self):
+        """認証画面らしいウィンドウの (WindowInfo, ルール名) のリスト"""
+        self.check_count += 1
+        hits = []
+        for window in self.tracker.current_windows():
+            if not window.title:
+                continue
+            rule = self.matcher.search(window.title.encode('utf-8'))
+            if rule is not None:
+                hits.append((window, rule))
+
+        known = {window.handle: rule for window, rule in hits}
+        for handle, rule in known.items():
+            if handle not in self.known:
+                self.appeared_count += 1
+                logging.info(f"認証画面らしいウィンドウが表示されました (ルール: {rule})")
+        self.known = known
+        return hits
+
+    def stats(self):
+        return {
+            'checks': self.check_count,
+            'appeared': self.appeared_count,
+            'open': len(self.known),
+        }